@@ -1,18 +1,29 @@
-from decimal import Decimal
+import os
 
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
 from django.http import HttpResponseRedirect
+from django.http import JsonResponse
 from django.shortcuts import reverse
+from django.urls import path
 from django.templatetags.static import static
 from django.utils.html import format_html
 from django.utils.http import is_safe_url
+from phonenumber_field.modelfields import PhoneNumberField
 
+from .forms import CachedPhoneNumberField
+from .forms import PrefetchedChoicesFormSet
+from .forms import PrefetchedModelChoiceField
+from .images import get_smallest_image_url
+from .models import Banner
 from .models import Order
 from .models import OrderItem
 from .models import Product
 from .models import ProductCategory
 from .models import Restaurant
 from .models import RestaurantMenuItem
+from .paginators import EstimatedCountPaginator
+from .phones import get_phonenumber_cache_stats
 
 
 class RestaurantMenuItemInline(admin.TabularInline):
@@ -51,6 +62,10 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = [
         'category',
     ]
+    # The order item autocomplete pages through products in this order
+    ordering = [
+        'name',
+    ]
     search_fields = [
         # FIXME SQLite can not convert letter case for cyrillic words properly, so search will be buggy.
         # Migration to PostgreSQL is necessary
@@ -103,7 +118,48 @@ class ProductAdmin(admin.ModelAdmin):
         if not obj.image or not obj.id:
             return 'нет картинки'
         edit_url = reverse('admin:foodcartapp_product_change', args=(obj.id,))
-        return format_html('<a href="{edit_url}"><img src="{src}" style="max-height: 50px;"/></a>', edit_url=edit_url, src=obj.image.url)
+        return format_html('<a href="{edit_url}"><img src="{src}" style="max-height: 50px;"/></a>', edit_url=edit_url, src=get_smallest_image_url(obj.image))
+    get_image_list_preview.short_description = 'превью'
+
+
+@admin.register(Banner)
+class BannerAdmin(admin.ModelAdmin):
+    list_display = [
+        'get_image_list_preview',
+        'title',
+        'position',
+        'active_from',
+        'active_until',
+    ]
+    list_display_links = [
+        'title',
+    ]
+    list_editable = [
+        'position',
+    ]
+    readonly_fields = [
+        'get_image_preview',
+    ]
+    fields = [
+        'title',
+        'text',
+        'image',
+        'get_image_preview',
+        'position',
+        'active_from',
+        'active_until',
+    ]
+
+    def get_image_preview(self, obj):
+        if not obj.image:
+            return 'выберите картинку'
+        return format_html('<img src="{url}" style="max-height: 200px;"/>', url=obj.image.url)
+    get_image_preview.short_description = 'превью'
+
+    def get_image_list_preview(self, obj):
+        if not obj.image:
+            return 'нет картинки'
+        return format_html('<img src="{src}" style="max-height: 50px;"/>', src=obj.image.url)
     get_image_list_preview.short_description = 'превью'
 
 
@@ -114,31 +170,93 @@ class ProductAdmin(admin.ModelAdmin):
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    pass
+    list_display = ['id', 'order', 'product', 'quantity', 'total_price']
+    list_select_related = ['order', 'product']
+    raw_id_fields = ['order']
+    autocomplete_fields = ['product']
+    search_fields = ['=order__id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
+    formset = PrefetchedChoicesFormSet
     fields = ['product', 'quantity', 'total_price']
     extra = 0
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'product':
+            kwargs['form_class'] = PrefetchedModelChoiceField
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
+    list_display = [
+        'id',
+        'firstname',
+        'lastname',
+        'address',
+        'total_price',
+        'status',
+        'payment_method',
+        'restaurant',
+        'registered_at',
+    ]
+    list_select_related = ['restaurant']
+    # date_hierarchy would run SELECT DISTINCT over the whole table on every
+    # load, the date filter only adds range lookups on the indexed column
+    list_filter = ['status', 'payment_method', 'registered_at']
     search_fields = ['firstname', 'lastname', 'address', 'phonenumber']
-    readonly_fields = ['registered_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = ['registered_at', 'total_price']
+    formfield_overrides = {
+        PhoneNumberField: {'form_class': CachedPhoneNumberField},
+    }
     inlines = [
         OrderItemInline
     ]
 
+    def get_urls(self):
+        return [
+            path(
+                'phonenumber-cache/',
+                self.admin_site.admin_view(self.phonenumber_cache_view),
+                name='foodcartapp_order_phonenumber_cache',
+            ),
+            *super().get_urls(),
+        ]
+
+    def phonenumber_cache_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        # Every worker process has its own cache: these are the stats of the
+        # process that served the request
+        return JsonResponse({'pid': os.getpid(), **get_phonenumber_cache_stats()})
+
     def save_formset(self, request, form, formset, change):
-        for item_form in formset.forms:
-            if not item_form.changed_data:
-                continue
-            obj = item_form.instance
-            obj.total_price = Decimal(obj.product.price * obj.quantity)
-            obj.save()
-        formset.save()
+        if formset.model is not OrderItem:
+            return super().save_formset(request, form, formset, change)
+
+        # Products come from the batch the formset fetched for validation
+        order_items = formset.save(commit=False)
+        new_order_items = []
+        changed_order_items = []
+        for order_item in order_items:
+            order_item.total_price = order_item.product.price * order_item.quantity
+            if order_item._state.adding:
+                new_order_items.append(order_item)
+            else:
+                changed_order_items.append(order_item)
+        OrderItem.objects.bulk_create(new_order_items)
+        OrderItem.objects.bulk_update(
+            changed_order_items, ['product', 'quantity', 'total_price']
+        )
+        OrderItem.objects.filter(
+            pk__in=[order_item.pk for order_item in formset.deleted_objects]
+        ).delete()
 
     def response_change(self, request, obj):
         result = super().response_change(request, obj)
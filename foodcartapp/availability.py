@@ -0,0 +1,74 @@
+import threading
+from collections import defaultdict
+
+from .models import Restaurant
+from .models import RestaurantMenuItem
+from .versions import VersionCounter
+
+AVAILABILITY_INDEX_VERSION_CACHE_KEY = 'foodcartapp:availability_index_version'
+
+
+class AvailabilityIndex:
+    # Every restaurant owns one bit, every product keeps the mask of
+    # restaurants that sell it, so the restaurants able to cook a whole
+    # order are the AND of its products' masks
+    def __init__(self, restaurant_ids, product_masks, version=None):
+        self.restaurant_ids = restaurant_ids
+        self.product_masks = product_masks
+        self.version = version
+
+    def get_restaurants_mask(self, product_ids):
+        restaurants_mask = (1 << len(self.restaurant_ids)) - 1
+        for product_id in product_ids:
+            restaurants_mask &= self.product_masks.get(product_id, 0)
+            if not restaurants_mask:
+                break
+        return restaurants_mask
+
+    def get_restaurant_ids(self, product_ids):
+        restaurants_mask = self.get_restaurants_mask(product_ids)
+        return [
+            restaurant_id
+            for position, restaurant_id in enumerate(self.restaurant_ids)
+            if restaurants_mask >> position & 1
+        ]
+
+
+def build_availability_index(version=None):
+    restaurant_ids = list(
+        Restaurant.objects.order_by('id').values_list('id', flat=True)
+    )
+    restaurant_bits = {
+        restaurant_id: 1 << position
+        for position, restaurant_id in enumerate(restaurant_ids)
+    }
+    product_masks = defaultdict(int)
+    menu_items = (
+        RestaurantMenuItem.objects
+        .filter(availability=True)
+        .values_list('restaurant_id', 'product_id')
+    )
+    for restaurant_id, product_id in menu_items:
+        product_masks[product_id] |= restaurant_bits.get(restaurant_id, 0)
+    return AvailabilityIndex(restaurant_ids, dict(product_masks), version)
+
+
+# Every process builds its own index and rebuilds it once the shared version
+# is bumped, so web workers and the background commands see menu changes
+# made in any other process
+availability_index_version = VersionCounter(AVAILABILITY_INDEX_VERSION_CACHE_KEY)
+availability_index = None
+availability_index_lock = threading.Lock()
+
+
+def get_availability_index():
+    global availability_index
+    version = availability_index_version.get()
+    with availability_index_lock:
+        if availability_index is None or availability_index.version != version:
+            availability_index = build_availability_index(version)
+        return availability_index
+
+
+def reset_availability_index():
+    availability_index_version.bump()
@@ -0,0 +1,69 @@
+from django.templatetags.static import static
+from django.utils import timezone
+
+from .models import Banner
+from .renderers import dumps_json
+from .snapshots import SnapshotStore
+
+BANNERS_VERSION_CACHE_KEY = 'foodcartapp:banners_version'
+
+DEFAULT_BANNERS = [
+    ('Burger', 'burger.jpg', 'Tasty Burger at your door step'),
+    ('Spices', 'food.jpg', 'All Cuisines'),
+    ('New York', 'tasty.jpg', 'Food is incomplete without a tasty dessert'),
+]
+
+
+def serialize_banners():
+    banners = [
+        {
+            'title': banner.title,
+            'src': banner.image.url,
+            'text': banner.text,
+        }
+        for banner in Banner.objects.active()
+    ]
+    if not banners and not Banner.objects.exists():
+        # Until banners are added in the admin the storefront shows the
+        # default ones from the static files
+        banners = [
+            {
+                'title': title,
+                'src': static(image_name),
+                'text': text,
+            }
+            for title, image_name, text in DEFAULT_BANNERS
+        ]
+    return dumps_json(banners)
+
+
+def get_banners_expiration():
+    # The nearest moment when a banner appears or disappears
+    now = timezone.now()
+    upcoming_dates = [
+        date
+        for dates in Banner.objects.values_list('active_from', 'active_until')
+        for date in dates
+        if date and date > now
+    ]
+    return min(upcoming_dates, default=None)
+
+
+def get_banners_last_change():
+    # The latest moment when a banner appeared or disappeared
+    now = timezone.now()
+    past_dates = [
+        date
+        for dates in Banner.objects.values_list('active_from', 'active_until')
+        for date in dates
+        if date and date <= now
+    ]
+    return max(past_dates, default=None)
+
+
+banners_store = SnapshotStore(
+    BANNERS_VERSION_CACHE_KEY,
+    serialize_banners,
+    get_banners_expiration,
+    get_banners_last_change,
+)
@@ -0,0 +1,191 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from location.distances import get_distance_matrix
+from location.geocoding import enqueue_addresses
+from location.geocoding import get_stored_coordinates
+from location.models import GeocoderTask
+
+from .availability import get_availability_index
+from .models import Order
+from .models import OrderCandidate
+from .models import Restaurant
+
+
+class RestaurantRecord:
+    __slots__ = ('id', 'name', 'coordinates', 'distance_column')
+
+    def __init__(self, id, name, coordinates, distance_column):
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'coordinates', coordinates)
+        object.__setattr__(self, 'distance_column', distance_column)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __str__(self):
+        return self.name
+
+
+def serialize_restaurants(restaurants):
+    restaurant_locations = get_stored_coordinates(
+        [restaurant.address for restaurant in restaurants],
+        GeocoderTask.RESTAURANT
+    )
+    enqueue_addresses(
+        [restaurant.address for restaurant in restaurants
+         if restaurant.address not in restaurant_locations],
+        GeocoderTask.RESTAURANT
+    )
+
+    serialized_restaurants = []
+    located_restaurants_count = 0
+    for restaurant in restaurants:
+        restaurant_coordinates = restaurant_locations.get(restaurant.address)
+        distance_column = None
+        if restaurant_coordinates and restaurant_coordinates['lon'] is None:
+            restaurant_coordinates = None
+        if restaurant_coordinates:
+            distance_column = located_restaurants_count
+            located_restaurants_count += 1
+
+        serialized_restaurants.append(
+            RestaurantRecord(
+                id=restaurant.id,
+                name=restaurant.name,
+                coordinates=restaurant_coordinates,
+                distance_column=distance_column,
+            )
+        )
+    return serialized_restaurants
+
+
+def get_order_distances(delivery_locations, restaurants):
+    located_addresses = [
+        address for address, coordinates in delivery_locations.items()
+        if coordinates['lon'] is not None
+    ]
+    located_restaurants = [
+        restaurant for restaurant in restaurants
+        if restaurant.distance_column is not None
+    ]
+
+    distances = get_distance_matrix(
+        [
+            (delivery_locations[address]['lat'], delivery_locations[address]['lon'])
+            for address in located_addresses
+        ],
+        [
+            (restaurant.coordinates['lat'], restaurant.coordinates['lon'])
+            for restaurant in located_restaurants
+        ],
+        precise=settings.PRECISE_DISTANCES
+    )
+    return dict(zip(located_addresses, distances))
+
+
+def get_available_restaurants(order_product_ids, restaurants, availability_index):
+    restaurant_ids = availability_index.get_restaurant_ids(order_product_ids)
+    return [
+        restaurants[restaurant_id] for restaurant_id in restaurant_ids
+        if restaurant_id in restaurants
+    ]
+
+
+def add_distance_to_user(restaurants, order_distances):
+    restaurants_with_distance = []
+    for restaurant in restaurants:
+        distance = None
+        if order_distances is not None and restaurant.distance_column is not None:
+            distance = float(order_distances[restaurant.distance_column])
+        restaurants_with_distance.append((restaurant, distance))
+    return restaurants_with_distance
+
+
+def get_distance_sort_key(restaurant_with_distance):
+    restaurant, distance = restaurant_with_distance
+    return distance is None, distance or 0
+
+
+def update_order_candidates(orders):
+    orders = list(orders)
+    if not orders:
+        return
+    prefetch_related_objects(orders, 'items')
+    # The flag is cleared before reading menus and locations: an
+    # invalidation that races with this update raises it again
+    Order.objects.filter(pk__in=[order.pk for order in orders]).update(
+        candidates_outdated=False
+    )
+
+    serialized_restaurants = serialize_restaurants(Restaurant.objects.all())
+    restaurants_by_id = {restaurant.id: restaurant for restaurant in serialized_restaurants}
+    availability_index = get_availability_index()
+    delivery_locations = get_stored_coordinates(
+        {order.address for order in orders}, GeocoderTask.DELIVERY
+    )
+    orders_distances = get_order_distances(delivery_locations, serialized_restaurants)
+
+    candidates = []
+    for order in orders:
+        order_product_ids = {order_item.product_id for order_item in order.items.all()}
+        available_restaurants = get_available_restaurants(
+            order_product_ids, restaurants_by_id, availability_index
+        )
+        available_restaurants_with_distance = sorted(
+            add_distance_to_user(available_restaurants, orders_distances.get(order.address)),
+            key=get_distance_sort_key
+        )
+        candidates.extend(
+            OrderCandidate(
+                order=order,
+                restaurant_id=restaurant.id,
+                rank=rank,
+                distance=distance,
+            )
+            for rank, (restaurant, distance) in enumerate(available_restaurants_with_distance)
+        )
+
+        delivery_coordinates = delivery_locations.get(order.address) or {}
+        order.candidates_outdated = False
+        order.candidates_updated_at = timezone.now()
+        order.delivery_lon = delivery_coordinates.get('lon')
+        order.delivery_lat = delivery_coordinates.get('lat')
+
+    with transaction.atomic():
+        OrderCandidate.objects.filter(order__in=orders).delete()
+        OrderCandidate.objects.bulk_create(candidates)
+        Order.objects.bulk_update(
+            orders, ['candidates_updated_at', 'delivery_lon', 'delivery_lat']
+        )
+
+
+def update_outdated_order_candidates(batch_size):
+    orders = list(
+        Order.objects
+        .filter(status='RAW', candidates_outdated=True)
+        .order_by('registered_at', 'id')[:batch_size]
+    )
+    update_order_candidates(orders)
+    return len(orders)
+
+
+def outdate_orders_with_products(product_ids):
+    Order.objects.filter(status='RAW', items__product_id__in=product_ids).update(
+        candidates_outdated=True
+    )
+
+
+def outdate_orders_with_restaurants(restaurant_ids):
+    Order.objects.filter(status='RAW', candidates__restaurant_id__in=restaurant_ids).update(
+        candidates_outdated=True
+    )
+
+
+def outdate_orders_with_addresses(addresses):
+    Order.objects.filter(status='RAW', address__in=addresses).update(
+        candidates_outdated=True
+    )
@@ -0,0 +1,107 @@
+from django import forms
+from django.conf import settings
+
+from .images import get_image_srcset
+from .images import get_image_webp_srcset
+from .models import Product
+from .renderers import dumps_json
+from .snapshots import SnapshotStore
+
+CATALOG_VERSION_CACHE_KEY = 'foodcartapp:catalog_version'
+
+PRODUCT_FIELDS = {
+    'id': lambda product: product.id,
+    'name': lambda product: product.name,
+    'price': lambda product: product.price,
+    'special_status': lambda product: product.special_status,
+    'description': lambda product: product.description,
+    'category': lambda product: {
+        'id': product.category.id,
+        'name': product.category.name,
+    },
+    'image': lambda product: product.image.url,
+    'image_srcset': lambda product: get_image_srcset(product.image),
+    'image_webp_srcset': lambda product: get_image_webp_srcset(product.image),
+    'restaurant': lambda product: {
+        'id': product.id,
+        'name': product.name,
+    },
+}
+# Columns loaded for every field, the rest of the row stays in the database
+PRODUCT_FIELD_COLUMNS = {
+    'id': [],
+    'name': ['name'],
+    'price': ['price'],
+    'special_status': ['special_status'],
+    'description': ['description'],
+    'category': ['category__id', 'category__name'],
+    'image': ['image'],
+    'image_srcset': ['image'],
+    'image_webp_srcset': ['image'],
+    'restaurant': ['name'],
+}
+
+
+def serialize_product(product, fields=PRODUCT_FIELDS):
+    return {field: PRODUCT_FIELDS[field](product) for field in fields}
+
+
+def serialize_catalog():
+    products = Product.objects.select_related('category').available()
+    return dumps_json([serialize_product(product) for product in products])
+
+
+catalog_store = SnapshotStore(CATALOG_VERSION_CACHE_KEY, serialize_catalog)
+
+
+class CatalogQuery(forms.Form):
+    category = forms.IntegerField(required=False, min_value=1)
+    fields = forms.CharField(required=False)
+    limit = forms.IntegerField(required=False, min_value=1)
+    cursor = forms.IntegerField(required=False, min_value=0)
+
+    def clean_fields(self):
+        fields = self.cleaned_data['fields']
+        if not fields:
+            return list(PRODUCT_FIELDS)
+        fields = list(dict.fromkeys(field.strip() for field in fields.split(',')))
+        unknown_fields = [field for field in fields if field not in PRODUCT_FIELDS]
+        if unknown_fields:
+            raise forms.ValidationError(
+                f'Неизвестные поля: {", ".join(unknown_fields)}. '
+                f'Доступные поля: {", ".join(PRODUCT_FIELDS)}.'
+            )
+        return fields
+
+    def clean_limit(self):
+        limit = self.cleaned_data['limit']
+        if limit is not None and limit > settings.CATALOG_PAGE_SIZE:
+            raise forms.ValidationError(
+                f'Не больше {settings.CATALOG_PAGE_SIZE} товаров на странице.'
+            )
+        return limit
+
+    def is_paginated(self):
+        return any(
+            self.cleaned_data[name] is not None for name in ['limit', 'cursor']
+        )
+
+
+def get_catalog_products(category_id=None, fields=PRODUCT_FIELDS, cursor=None, limit=None):
+    # Ordered by id to walk the partial index of available products
+    products = Product.objects.available().order_by('id')
+    if category_id is not None:
+        products = products.filter(category_id=category_id)
+    if 'category' in fields:
+        products = products.select_related('category')
+    columns = [column for field in fields for column in PRODUCT_FIELD_COLUMNS[field]]
+    products = products.only(*columns)
+
+    if cursor is not None:
+        products = products.filter(id__gt=cursor)
+    if limit is None:
+        return [serialize_product(product, fields) for product in products], None
+
+    products = list(products[:limit + 1])
+    next_cursor = products[limit - 1].id if len(products) > limit else None
+    return [serialize_product(product, fields) for product in products[:limit]], next_cursor
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Warning
+from django.core.checks import register
+
+LOCAL_CACHE_BACKENDS = [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+]
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    if settings.DEBUG:
+        return []
+    if settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [
+        Warning(
+            'Кэш по умолчанию хранится в памяти процесса',
+            hint=(
+                'Другие процессы сайта не узнают об изменениях каталога, '
+                'баннеров и меню. Укажите общий кэш в CACHE_URL.'
+            ),
+            id='foodcartapp.W001',
+        )
+    ]
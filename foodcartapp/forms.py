@@ -0,0 +1,62 @@
+from django import forms
+from django.core import validators
+from django.core.exceptions import ValidationError
+from django.forms.models import BaseInlineFormSet
+from phonenumber_field.formfields import PhoneNumberField
+
+from .phones import DEFAULT_PHONE_REGION
+from .phones import InvalidPhoneNumber
+from .phones import normalize_phonenumber
+
+
+class CachedPhoneNumberField(PhoneNumberField):
+    def to_python(self, value):
+        if value in validators.EMPTY_VALUES:
+            return self.empty_value
+        try:
+            return normalize_phonenumber(value, self.region or DEFAULT_PHONE_REGION)
+        except InvalidPhoneNumber:
+            raise ValidationError(self.error_messages['invalid'], code='invalid')
+
+
+class PrefetchedModelChoiceField(forms.ModelChoiceField):
+    # Takes the chosen object from a batch that the formset fetched for all
+    # its forms at once instead of querying it for every form
+    prefetched_objects = None
+
+    def to_python(self, value):
+        if value in self.empty_values or self.prefetched_objects is None:
+            return super().to_python(value)
+        try:
+            pk = self.queryset.model._meta.pk.to_python(value)
+        except ValidationError:
+            pk = None
+        if pk not in self.prefetched_objects:
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return self.prefetched_objects[pk]
+
+
+class PrefetchedChoicesFormSet(BaseInlineFormSet):
+    def prefetch_choices(self):
+        for field_name, field in self.form.base_fields.items():
+            if not isinstance(field, PrefetchedModelChoiceField):
+                continue
+            pks = set()
+            for form in self.forms:
+                try:
+                    pks.add(field.queryset.model._meta.pk.to_python(form[field_name].data))
+                except ValidationError:
+                    continue
+            pks.discard(None)
+            prefetched_objects = field.queryset.in_bulk(pks)
+            for form in self.forms:
+                form.fields[field_name].prefetched_objects = prefetched_objects
+
+    def full_clean(self):
+        if self.is_bound:
+            self.prefetch_choices()
+        super().full_clean()
@@ -0,0 +1,63 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import IdempotencyKey
+from .models import QueuedOrder
+
+IDEMPOTENCY_KEY_MAX_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def get_request_fingerprint(data):
+    dumped_data = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(dumped_data.encode()).hexdigest()
+
+
+def get_stored_idempotency_key(key):
+    return (
+        IdempotencyKey.objects
+        .actual()
+        .select_related('order')
+        .filter(key=key)
+        .first()
+    )
+
+
+def store_idempotency_key(key, request_fingerprint, order, response_body):
+    # Must run in the transaction that creates the order. A concurrent
+    # request with the same key fails on the unique index and rolls back.
+    # The response is stored as it was sent: the order may be edited later
+    IdempotencyKey.objects.expired().filter(key=key).delete()
+    return IdempotencyKey.objects.create(
+        key=key,
+        request_fingerprint=request_fingerprint,
+        order=order,
+        expires_at=timezone.now() + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL),
+        response_body=response_body,
+    )
+
+
+def get_queued_orders_keys_expiration_date():
+    return timezone.now() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def get_queued_order_by_idempotency_key(key):
+    return QueuedOrder.objects.filter(
+        idempotency_key=key,
+        queued_at__gt=get_queued_orders_keys_expiration_date(),
+    ).first()
+
+
+def release_expired_queued_orders_keys(key=None):
+    # A queued order keeps its key for IDEMPOTENCY_KEY_TTL hours like an
+    # order created right away, then the key can be used again
+    queued_orders = QueuedOrder.objects.filter(
+        idempotency_key__isnull=False,
+        queued_at__lte=get_queued_orders_keys_expiration_date(),
+    )
+    if key is not None:
+        queued_orders = queued_orders.filter(idempotency_key=key)
+    return queued_orders.update(idempotency_key=None)
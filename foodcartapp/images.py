@@ -0,0 +1,115 @@
+import os
+import posixpath
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image
+from PIL import features
+
+DERIVATIVES_DIR = 'derivatives'
+DERIVATIVE_QUALITY = 85
+SAVE_FORMATS = {
+    'jpg': 'JPEG',
+    'png': 'PNG',
+    'webp': 'WEBP',
+}
+
+
+def is_webp_supported():
+    return features.check('webp')
+
+
+def get_derivative_extension(image_name):
+    extension = posixpath.splitext(image_name)[1].lower()
+    return 'png' if extension == '.png' else 'jpg'
+
+
+def get_derivative_name(image_name, width, extension):
+    stem = posixpath.splitext(image_name)[0]
+    return posixpath.join(DERIVATIVES_DIR, f'{stem}-{width}w.{extension}')
+
+
+def get_derivative_extensions(image_name):
+    extensions = [get_derivative_extension(image_name)]
+    if is_webp_supported():
+        extensions.append('webp')
+    return extensions
+
+
+def save_derivative(image, path, extension):
+    # Written next to the target and renamed, so a web server or a parallel
+    # worker never reads a half-written file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    image_format = SAVE_FORMATS[extension]
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(file_descriptor, 'wb') as file:
+            image.save(file, image_format, quality=DERIVATIVE_QUALITY, optimize=True)
+        os.chmod(temporary_path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def generate_derivatives(image_name, force=False):
+    targets = []
+    for width in settings.PRODUCT_IMAGE_WIDTHS:
+        for extension in get_derivative_extensions(image_name):
+            path = default_storage.path(get_derivative_name(image_name, width, extension))
+            if force or not os.path.exists(path):
+                targets.append((width, extension, path))
+    # Fixtures and copied databases may refer to files that are not uploaded
+    if not targets or not default_storage.exists(image_name):
+        return 0
+
+    with default_storage.open(image_name) as file:
+        image = Image.open(file)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    written_count = 0
+    for width, extension, path in targets:
+        # Images are never upscaled, a width wider than the source is skipped
+        if width > image.width:
+            continue
+        derivative = image.copy()
+        derivative.thumbnail((width, image.height), Image.LANCZOS)
+        save_derivative(derivative, path, extension)
+        written_count += 1
+    return written_count
+
+
+def get_srcset(image_name, extension):
+    srcset = []
+    for width in settings.PRODUCT_IMAGE_WIDTHS:
+        derivative_name = get_derivative_name(image_name, width, extension)
+        if default_storage.exists(derivative_name):
+            srcset.append(f'{default_storage.url(derivative_name)} {width}w')
+    return ', '.join(srcset)
+
+
+def get_image_srcset(image):
+    if not image:
+        return ''
+    return get_srcset(image.name, get_derivative_extension(image.name))
+
+
+def get_image_webp_srcset(image):
+    if not image or not is_webp_supported():
+        return ''
+    return get_srcset(image.name, 'webp')
+
+
+def get_smallest_image_url(image):
+    for width in sorted(settings.PRODUCT_IMAGE_WIDTHS):
+        derivative_name = get_derivative_name(
+            image.name, width, get_derivative_extension(image.name)
+        )
+        if default_storage.exists(derivative_name):
+            return default_storage.url(derivative_name)
+    return image.url
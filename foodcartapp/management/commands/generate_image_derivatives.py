@@ -0,0 +1,48 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from foodcartapp.catalog import catalog_store
+from foodcartapp.images import generate_derivatives
+from foodcartapp.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии и WebP-версии картинок товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='сколько процессов обрабатывают картинки, по умолчанию по числу ядер'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='пересоздать уже существующие копии'
+        )
+
+    def handle(self, *args, **options):
+        image_names = sorted(set(
+            Product.objects
+            .exclude(image='')
+            .values_list('image', flat=True)
+        ))
+        # Worker processes are forked and must not share the database connections
+        connections.close_all()
+
+        written_count = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            generate = partial(generate_derivatives, force=options['force'])
+            for image_name, image_written_count in zip(
+                image_names, executor.map(generate, image_names, chunksize=8)
+            ):
+                written_count += image_written_count
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{image_name}: {image_written_count}')
+
+        if written_count:
+            catalog_store.bump_version()
+        self.stdout.write(
+            f'Обработано картинок: {len(image_names)}, создано копий: {written_count}'
+        )
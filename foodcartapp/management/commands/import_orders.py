@@ -0,0 +1,56 @@
+import json
+import sys
+from itertools import chain
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from foodcartapp.orders import import_orders
+from foodcartapp.orders import iter_ndjson_records
+from foodcartapp.renderers import dumps_json
+
+
+class Command(BaseCommand):
+    help = 'Загружает заказы из файла в формате NDJSON или JSON-массива'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='путь к файлу, "-" — читать из стандартного ввода'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.ORDERS_IMPORT_CHUNK_SIZE,
+            help='сколько заказов записывать в базу за одну транзакцию'
+        )
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            self.import_file(sys.stdin, options['chunk_size'])
+            return
+        try:
+            with open(options['path'], encoding='utf-8') as file:
+                self.import_file(file, options['chunk_size'])
+        except OSError as error:
+            raise CommandError(error)
+
+    def import_file(self, file, chunk_size):
+        first_line = file.readline()
+        if first_line.lstrip().startswith('['):
+            # A JSON array can not be parsed line by line and is read whole
+            try:
+                records = json.loads(first_line + file.read())
+            except ValueError as error:
+                raise CommandError(f'Некорректный JSON: {error}')
+        else:
+            records = iter_ndjson_records(chain([first_line], file))
+
+        imported_count = 0
+        failed_count = 0
+        for result in import_orders(records, chunk_size):
+            if 'errors' in result:
+                failed_count += 1
+                self.stderr.write(dumps_json(result).decode())
+            else:
+                imported_count += 1
+        self.stdout.write(f'Загружено заказов: {imported_count}, с ошибками: {failed_count}')
@@ -0,0 +1,37 @@
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from foodcartapp.banners import DEFAULT_BANNERS
+from foodcartapp.models import Banner
+
+
+class Command(BaseCommand):
+    help = 'Создаёт баннеры по умолчанию с картинками из assets/, если баннеров ещё нет'
+
+    def handle(self, *args, **options):
+        if Banner.objects.exists():
+            self.stdout.write('Баннеры уже есть')
+            return
+
+        created_banners = 0
+        for position, (title, image_name, text) in enumerate(DEFAULT_BANNERS):
+            image_path = os.path.join(settings.BASE_DIR, 'assets', image_name)
+            if not os.path.exists(image_path):
+                self.stderr.write(f'Нет картинки {image_path}, баннер «{title}» пропущен')
+                continue
+            stored_name = f'banners/{image_name}'
+            if not default_storage.exists(stored_name):
+                with open(image_path, 'rb') as image_file:
+                    stored_name = default_storage.save(stored_name, File(image_file))
+            Banner.objects.create(
+                title=title,
+                text=text,
+                image=stored_name,
+                position=position,
+            )
+            created_banners += 1
+        self.stdout.write(f'Создано баннеров: {created_banners}')
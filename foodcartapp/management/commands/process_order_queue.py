@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from foodcartapp.models import QueuedOrder
+from foodcartapp.orders import process_queued_orders
+
+
+class Command(BaseCommand):
+    help = 'Создаёт заказы, принятые API в режиме очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='сколько заказов создавать за одну транзакцию'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=1,
+            help='пауза в секундах, если очередь пуста'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='разобрать очередь один раз и завершиться'
+        )
+        parser.add_argument(
+            '--purge-older-than', type=int, default=None, metavar='DAYS',
+            help='удалить из очереди обработанные заказы старше стольких дней'
+        )
+
+    def handle(self, *args, **options):
+        if options['purge_older_than'] is not None:
+            purged_count, _ = (
+                QueuedOrder.objects
+                .exclude(status=QueuedOrder.QUEUED)
+                .filter(queued_at__lt=timezone.now() - timedelta(days=options['purge_older_than']))
+                .delete()
+            )
+            self.stdout.write(f'Удалено из очереди: {purged_count}')
+
+        while True:
+            processed_count = process_queued_orders(options['batch_size'])
+            if processed_count:
+                self.stdout.write(f'Обработано заказов из очереди: {processed_count}')
+            if options['once'] and processed_count < options['batch_size']:
+                return
+            if not processed_count:
+                time.sleep(options['sleep'])
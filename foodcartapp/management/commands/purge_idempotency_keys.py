@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.idempotency import release_expired_queued_orders_keys
+from foodcartapp.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Удаляет просроченные ключи идемпотентности заказов'
+
+    def handle(self, *args, **options):
+        deleted_count, _ = IdempotencyKey.objects.expired().delete()
+        released_count = release_expired_queued_orders_keys()
+        self.stdout.write(f'Удалено ключей: {deleted_count + released_count}')
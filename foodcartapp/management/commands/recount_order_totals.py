@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Сверяет стоимость заказов с суммой их позиций и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='только показать заказы с расхождениями, ничего не исправлять'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            fixed_orders = Order.objects.update_total_price()
+            self.stdout.write(f'Исправлено заказов: {fixed_orders}')
+            return
+
+        outdated_orders = Order.objects.with_outdated_total_price().values_list(
+            'id', 'total_price', 'actual_total_price'
+        )
+        outdated_count = 0
+        for order_id, total_price, actual_total_price in outdated_orders.iterator():
+            outdated_count += 1
+            self.stdout.write(f'Заказ {order_id}: {total_price} вместо {actual_total_price}')
+        self.stdout.write(f'Заказов с расхождениями: {outdated_count}')
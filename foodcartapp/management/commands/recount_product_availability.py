@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodcartapp.models import Product
+from foodcartapp.models import update_products_availability
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает, в скольких ресторанах товары есть в продаже'
+
+    def handle(self, *args, **options):
+        # Goes through update_products_availability, so the catalog, the
+        # availability index and the orders candidates are refreshed too
+        with transaction.atomic():
+            product_ids = list(
+                Product.objects
+                .with_outdated_available_restaurant_count()
+                .values_list('id', flat=True)
+            )
+            update_products_availability(product_ids)
+        self.stdout.write(f'Исправлено товаров: {len(product_ids)}')
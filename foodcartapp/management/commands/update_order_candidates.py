@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.candidates import update_outdated_order_candidates
+
+
+class Command(BaseCommand):
+    help = 'Подбирает рестораны для заказов, у которых подбор устарел'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='сколько заказов обрабатывать за один проход'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=5,
+            help='пауза в секундах, если устаревших заказов нет'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='обработать устаревшие заказы один раз и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            updated_orders = update_outdated_order_candidates(options['batch_size'])
+            if updated_orders:
+                self.stdout.write(f'Обновлено заказов: {updated_orders}')
+            if options['once'] and updated_orders < options['batch_size']:
+                return
+            if not updated_orders:
+                time.sleep(options['sleep'])
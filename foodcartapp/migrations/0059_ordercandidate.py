@@ -0,0 +1,50 @@
+# Generated by Django 3.2 on 2026-10-18 19:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0058_order_foodcartapp_status_618cc3_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='candidates_outdated',
+            field=models.BooleanField(db_index=True, default=True, verbose_name='подбор ресторанов устарел'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='candidates_updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='время подбора ресторанов'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_lat',
+            field=models.FloatField(blank=True, null=True, verbose_name='широта адреса при подборе ресторанов'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_lon',
+            field=models.FloatField(blank=True, null=True, verbose_name='долгота адреса при подборе ресторанов'),
+        ),
+        migrations.CreateModel(
+            name='OrderCandidate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='место в подборе')),
+                ('distance', models.FloatField(blank=True, null=True, verbose_name='расстояние до клиента, км')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candidates', to='foodcartapp.order', verbose_name='заказ')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_candidates', to='foodcartapp.restaurant', verbose_name='ресторан')),
+            ],
+            options={
+                'verbose_name': 'ресторан для заказа',
+                'verbose_name_plural': 'рестораны для заказов',
+                'ordering': ['order', 'rank'],
+                'unique_together': {('order', 'restaurant')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_available_restaurants(apps, schema_editor):
+    Product = apps.get_model('foodcartapp', 'Product')
+    RestaurantMenuItem = apps.get_model('foodcartapp', 'RestaurantMenuItem')
+    restaurant_counts = (
+        RestaurantMenuItem.objects
+        .filter(availability=True)
+        .values('product')
+        .annotate(count=Count('id'))
+        .values_list('product', 'count')
+    )
+    for product_id, restaurant_count in restaurant_counts:
+        Product.objects.filter(pk=product_id).update(available_restaurant_count=restaurant_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0059_ordercandidate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='available_restaurant_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='в продаже в ресторанах'),
+        ),
+        migrations.RunPython(count_available_restaurants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0060_product_available_restaurant_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(available_restaurant_count__gt=0), fields=['category', 'id'], name='product_available_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(available_restaurant_count__gt=0), fields=['id'], name='product_available_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2 on 2026-10-18 19:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0064_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedOrder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='токен')),
+                ('payload', models.JSONField(verbose_name='проверенные данные заказа')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('created', 'Заказ создан'), ('failed', 'Ошибка')], db_index=True, default='queued', max_length=7, verbose_name='статус')),
+                ('error', models.TextField(blank=True, verbose_name='ошибка')),
+                ('idempotency_key', models.CharField(blank=True, max_length=255, null=True, unique=True, verbose_name='ключ идемпотентности')),
+                ('request_fingerprint', models.CharField(blank=True, max_length=64, verbose_name='хэш запроса')),
+                ('queued_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='поставлен в очередь')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='обработан')),
+                ('order', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='queued_order', to='foodcartapp.order', verbose_name='заказ')),
+            ],
+            options={
+                'verbose_name': 'заказ в очереди',
+                'verbose_name_plural': 'заказы в очереди',
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2 on 2026-10-18 19:55
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+
+def count_order_total_prices(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderItem = apps.get_model('foodcartapp', 'OrderItem')
+    items_total_price = (
+        OrderItem.objects
+        .filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(total_price=Sum('total_price'))
+        .values('total_price')
+    )
+    Order.objects.update(
+        total_price=Coalesce(
+            Subquery(items_total_price),
+            Value(Decimal(0)),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0065_queuedorder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='стоимость заказа'),
+        ),
+        migrations.RunPython(count_order_total_prices, migrations.RunPython.noop),
+    ]
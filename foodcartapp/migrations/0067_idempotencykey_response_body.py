@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+def store_response_bodies(apps, schema_editor):
+    IdempotencyKey = apps.get_model('foodcartapp', 'IdempotencyKey')
+    idempotency_keys = list(IdempotencyKey.objects.select_related('order'))
+    for idempotency_key in idempotency_keys:
+        order = idempotency_key.order
+        idempotency_key.response_body = {
+            'firstname': order.firstname,
+            'lastname': order.lastname,
+            'address': order.address,
+            'phonenumber': str(order.phonenumber),
+        }
+    IdempotencyKey.objects.bulk_update(idempotency_keys, ['response_body'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0066_order_total_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='response_body',
+            field=models.JSONField(default=dict, verbose_name='тело ответа'),
+        ),
+        migrations.RunPython(store_response_bodies, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,19 @@
+import uuid
+from decimal import Decimal
+
 from django.db import models
+from django.db import transaction
 from django.core.validators import MinValueValidator
+from django.db.models import Count
 from django.db.models import DecimalField
 from django.db.models import F
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models import Subquery
+from django.db.models import Value
 from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
 from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
 
@@ -31,14 +42,89 @@ class Restaurant(models.Model):
         return self.name
 
 
+# Sent by RestaurantMenuItem bulk operations that bypass post_save and
+# post_delete, with the ids of the products whose menu items changed
+menu_items_changed = Signal()
+
+
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
+        return self.filter(available_restaurant_count__gt=0)
+
+    def with_actual_available_restaurant_count(self):
+        available_menu_items = (
             RestaurantMenuItem.objects
-            .filter(availability=True)
-            .values_list('product')
+            .filter(product=OuterRef('pk'), availability=True)
+            .order_by()
+            .values('product')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        return self.annotate(
+            actual_available_restaurant_count=Coalesce(Subquery(available_menu_items), 0)
+        )
+
+    def with_outdated_available_restaurant_count(self):
+        return (
+            self.with_actual_available_restaurant_count()
+            .exclude(available_restaurant_count=F('actual_available_restaurant_count'))
+        )
+
+    def update_available_restaurant_count(self):
+        return self.with_outdated_available_restaurant_count().update(
+            available_restaurant_count=F('actual_available_restaurant_count')
+        )
+
+
+class BannerQuerySet(models.QuerySet):
+    def active(self, now=None):
+        now = now or timezone.now()
+        return self.filter(
+            Q(active_from__isnull=True) | Q(active_from__lte=now),
+            Q(active_until__isnull=True) | Q(active_until__gt=now),
         )
-        return self.filter(pk__in=products)
+
+
+class Banner(models.Model):
+    title = models.CharField(
+        'заголовок',
+        max_length=50
+    )
+    text = models.CharField(
+        'текст',
+        max_length=200,
+        blank=True,
+    )
+    image = models.ImageField(
+        'картинка',
+        upload_to='banners',
+    )
+    position = models.PositiveIntegerField(
+        'порядок',
+        default=0,
+        db_index=True,
+        help_text='баннеры с меньшим числом показываются раньше',
+    )
+    active_from = models.DateTimeField(
+        'показывать с',
+        null=True,
+        blank=True,
+    )
+    active_until = models.DateTimeField(
+        'показывать до',
+        null=True,
+        blank=True,
+    )
+
+    objects = BannerQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'баннер'
+        verbose_name_plural = 'баннеры'
+        ordering = ['position', 'id']
+
+    def __str__(self):
+        return self.title
 
 
 class ProductCategory(models.Model):
@@ -87,17 +173,74 @@ class Product(models.Model):
         max_length=200,
         blank=True,
     )
+    available_restaurant_count = models.PositiveIntegerField(
+        'в продаже в ресторанах',
+        default=0,
+        db_index=True,
+        editable=False,
+    )
 
     objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'товар'
         verbose_name_plural = 'товары'
+        indexes = [
+            models.Index(
+                fields=['category', 'id'],
+                condition=Q(available_restaurant_count__gt=0),
+                name='product_available_category_idx',
+            ),
+            models.Index(
+                fields=['id'],
+                condition=Q(available_restaurant_count__gt=0),
+                name='product_available_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RestaurantMenuItemQuerySet(models.QuerySet):
+    def get_product_ids(self):
+        return set(self.values_list('product_id', flat=True))
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db):
+            product_ids = self.get_product_ids()
+            updated_count = super().update(**kwargs)
+            # Moved rows no longer match the filter, the new product is
+            # taken from the arguments
+            for field_name in ['product', 'product_id']:
+                if field_name in kwargs:
+                    product_ids.add(getattr(kwargs[field_name], 'pk', kwargs[field_name]))
+            update_products_availability(product_ids)
+        return updated_count
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            menu_items = super().bulk_create(objs, *args, **kwargs)
+            update_products_availability({menu_item.product_id for menu_item in menu_items})
+        return menu_items
+
+    def bulk_update(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            product_ids = self.filter(pk__in=[menu_item.pk for menu_item in objs]).get_product_ids()
+            updated_count = super().bulk_update(objs, *args, **kwargs)
+            product_ids |= {menu_item.product_id for menu_item in objs}
+            update_products_availability(product_ids)
+        return updated_count
+
+
+def update_products_availability(product_ids):
+    if not product_ids:
+        return
+    Product.objects.filter(pk__in=product_ids).update_available_restaurant_count()
+    menu_items_changed.send(sender=RestaurantMenuItem, product_ids=product_ids)
+
+
 class RestaurantMenuItem(models.Model):
     restaurant = models.ForeignKey(
         Restaurant,
@@ -117,6 +260,8 @@ class RestaurantMenuItem(models.Model):
         db_index=True
     )
 
+    objects = RestaurantMenuItemQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'пункт меню ресторана'
         verbose_name_plural = 'пункты меню ресторана'
@@ -127,16 +272,44 @@ class RestaurantMenuItem(models.Model):
     def __str__(self):
         return f"{self.restaurant.name} - {self.product.name}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            product_ids = {self.product_id}
+            if not self._state.adding:
+                product_ids |= RestaurantMenuItem.objects.filter(pk=self.pk).get_product_ids()
+            super().save(*args, **kwargs)
+            Product.objects.filter(pk__in=product_ids).update_available_restaurant_count()
+
 
 class OrderQuerySet(models.QuerySet):
-    def total_price(self):
-        orders = self.annotate(
-            total_price=Sum(
-                F('items__total_price'),
-                output_field=DecimalField()
+    def with_actual_total_price(self):
+        items_total_price = (
+            OrderItem.objects
+            .filter(order=OuterRef('pk'))
+            .order_by()
+            .values('order')
+            .annotate(total_price=Sum('total_price'))
+            .values('total_price')
+        )
+        return self.annotate(
+            actual_total_price=Coalesce(
+                Subquery(items_total_price),
+                Value(Decimal(0)),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
             )
         )
-        return orders
+
+    def with_outdated_total_price(self):
+        return (
+            self.with_actual_total_price()
+            .exclude(total_price=F('actual_total_price'))
+        )
+
+    def update_total_price(self):
+        return (
+            self.with_outdated_total_price()
+            .update(total_price=F('actual_total_price'))
+        )
 
 
 class Order(models.Model):
@@ -200,17 +373,90 @@ class Order(models.Model):
         verbose_name='время доставки заказа',
         null=True, blank=True, db_index=True
     )
+    candidates_outdated = models.BooleanField(
+        'подбор ресторанов устарел',
+        default=True, db_index=True
+    )
+    candidates_updated_at = models.DateTimeField(
+        verbose_name='время подбора ресторанов',
+        null=True, blank=True
+    )
+    delivery_lon = models.FloatField(
+        'долгота адреса при подборе ресторанов',
+        null=True, blank=True
+    )
+    delivery_lat = models.FloatField(
+        'широта адреса при подборе ресторанов',
+        null=True, blank=True
+    )
+    total_price = models.DecimalField(
+        'стоимость заказа',
+        max_digits=10, decimal_places=2,
+        default=0, editable=False
+    )
 
     objects = OrderQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'заказ'
         verbose_name_plural = 'заказы'
+        indexes = [
+            models.Index(fields=['status', 'registered_at', 'id']),
+        ]
 
     def __str__(self):
         return f'{self.firstname} {self.lastname} {self.address}'
 
 
+def update_orders_total_price(order_ids):
+    Order.objects.filter(pk__in=order_ids).update_total_price()
+
+
+class OrderItemQuerySet(models.QuerySet):
+    def get_order_ids(self):
+        return set(self.values_list('order_id', flat=True))
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db):
+            order_ids = self.get_order_ids()
+            updated_count = super().update(**kwargs)
+            for field_name in ['order', 'order_id']:
+                if field_name in kwargs:
+                    order_ids.add(getattr(kwargs[field_name], 'pk', kwargs[field_name]))
+            Order.objects.filter(pk__in=order_ids).update_total_price()
+        return updated_count
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            order_items = super().bulk_create(objs, *args, **kwargs)
+            Order.objects.filter(
+                pk__in={order_item.order_id for order_item in order_items}
+            ).update_total_price()
+        return order_items
+
+    def _bulk_create_counted(self, objs, *args, **kwargs):
+        # For new orders that were saved with their total price already
+        # counted, so recounting it would only repeat the same query
+        return super().bulk_create(objs, *args, **kwargs)
+    _bulk_create_counted.queryset_only = False
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            order_ids = self.get_order_ids()
+            deleted = super().delete()
+            Order.objects.filter(pk__in=order_ids).update_total_price()
+        return deleted
+
+    def bulk_update(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            order_ids = self.filter(pk__in=[order_item.pk for order_item in objs]).get_order_ids()
+            updated_count = super().bulk_update(objs, *args, **kwargs)
+            order_ids |= {order_item.order_id for order_item in objs}
+            Order.objects.filter(pk__in=order_ids).update_total_price()
+        return updated_count
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(
         Order, verbose_name='заказ',
@@ -232,6 +478,8 @@ class OrderItem(models.Model):
         validators=[MinValueValidator(0)]
     )
 
+    objects = OrderItemQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'элемент заказа'
         verbose_name_plural = 'элементы заказа'
@@ -241,3 +489,150 @@ class OrderItem(models.Model):
                f'{self.order.firstname} ' \
                f'{self.order.lastname} ' \
                f'{self.order.address}'
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            order_ids = {self.order_id}
+            if not self._state.adding:
+                order_ids |= OrderItem.objects.filter(pk=self.pk).get_order_ids()
+            super().save(*args, **kwargs)
+            Order.objects.filter(pk__in=order_ids).update_total_price()
+
+    # There is no post_delete receiver for order items: it would stop Django
+    # from fast deleting the items of a deleted order
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            deleted = super().delete(*args, **kwargs)
+            Order.objects.filter(pk=self.order_id).update_total_price()
+        return deleted
+
+
+class OrderCandidate(models.Model):
+    order = models.ForeignKey(
+        Order, verbose_name='заказ',
+        related_name='candidates',
+        on_delete=models.CASCADE
+    )
+    restaurant = models.ForeignKey(
+        Restaurant, verbose_name='ресторан',
+        related_name='order_candidates',
+        on_delete=models.CASCADE
+    )
+    rank = models.PositiveSmallIntegerField('место в подборе')
+    distance = models.FloatField(
+        'расстояние до клиента, км',
+        null=True, blank=True
+    )
+
+    class Meta:
+        verbose_name = 'ресторан для заказа'
+        verbose_name_plural = 'рестораны для заказов'
+        ordering = ['order', 'rank']
+        unique_together = [
+            ['order', 'restaurant']
+        ]
+
+    def __str__(self):
+        return f'{self.order_id} - {self.restaurant}'
+
+
+class IdempotencyKeyQuerySet(models.QuerySet):
+    def expired(self, now=None):
+        return self.filter(expires_at__lte=now or timezone.now())
+
+    def actual(self, now=None):
+        return self.filter(expires_at__gt=now or timezone.now())
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField(
+        'ключ',
+        max_length=255,
+        unique=True
+    )
+    request_fingerprint = models.CharField(
+        'хэш запроса',
+        max_length=64
+    )
+    order = models.ForeignKey(
+        Order, verbose_name='заказ',
+        related_name='idempotency_keys',
+        on_delete=models.CASCADE
+    )
+    expires_at = models.DateTimeField(
+        'действует до',
+        db_index=True
+    )
+    response_body = models.JSONField(
+        'тело ответа',
+        default=dict
+    )
+
+    objects = IdempotencyKeyQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'ключ идемпотентности'
+        verbose_name_plural = 'ключи идемпотентности'
+
+    def __str__(self):
+        return self.key
+
+
+class QueuedOrder(models.Model):
+    QUEUED = 'queued'
+    CREATED = 'created'
+    FAILED = 'failed'
+    STATUS = [
+        (QUEUED, 'В очереди'),
+        (CREATED, 'Заказ создан'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    token = models.UUIDField(
+        'токен',
+        default=uuid.uuid4,
+        unique=True,
+        editable=False
+    )
+    payload = models.JSONField('проверенные данные заказа')
+    status = models.CharField(
+        'статус',
+        max_length=7,
+        choices=STATUS,
+        default=QUEUED,
+        db_index=True
+    )
+    order = models.OneToOneField(
+        Order, verbose_name='заказ',
+        related_name='queued_order',
+        null=True, blank=True,
+        on_delete=models.SET_NULL
+    )
+    error = models.TextField('ошибка', blank=True)
+    idempotency_key = models.CharField(
+        'ключ идемпотентности',
+        max_length=255,
+        null=True, blank=True,
+        unique=True
+    )
+    request_fingerprint = models.CharField(
+        'хэш запроса',
+        max_length=64,
+        blank=True
+    )
+    queued_at = models.DateTimeField(
+        'поставлен в очередь',
+        default=timezone.now,
+        db_index=True
+    )
+    processed_at = models.DateTimeField(
+        'обработан',
+        null=True, blank=True
+    )
+
+    class Meta:
+        verbose_name = 'заказ в очереди'
+        verbose_name_plural = 'заказы в очереди'
+
+    def __str__(self):
+        return str(self.token)
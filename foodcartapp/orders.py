@@ -0,0 +1,194 @@
+import json
+from decimal import Decimal
+from functools import partial
+from itertools import islice
+
+from django.db import connections
+from django.db import router
+from django.db import transaction
+from django.utils import timezone
+
+from location.geocoding import enqueue_missing_addresses
+from location.models import GeocoderTask
+
+from .candidates import update_order_candidates
+from .models import Order
+from .models import OrderItem
+from .models import Product
+from .models import QueuedOrder
+from .phones import normalize_phonenumber
+from .serializers import OrderSerializer
+
+
+def create_orders(validated_orders):
+    # Must run inside a transaction: candidates are picked after the commit
+    orders = [
+        Order(
+            address=validated_order['address'],
+            firstname=validated_order['firstname'],
+            lastname=validated_order['lastname'],
+            phonenumber=validated_order['phonenumber'],
+            registered_at=validated_order.get('registered_at') or timezone.now(),
+            total_price=sum(
+                product['product'].price * product['quantity']
+                for product in validated_order['products']
+            ),
+        )
+        for validated_order in validated_orders
+    ]
+    connection = connections[router.db_for_write(Order)]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Order.objects.bulk_create(orders)
+    else:
+        # Without RETURNING bulk_create leaves primary keys empty, and order
+        # items can not refer to the orders
+        for order in orders:
+            order.save(force_insert=True)
+
+    OrderItem.objects._bulk_create_counted([
+        OrderItem(
+            order=order,
+            product=product['product'],
+            quantity=product['quantity'],
+            total_price=product['product'].price * product['quantity']
+        )
+        for order, validated_order in zip(orders, validated_orders)
+        for product in validated_order['products']
+    ])
+    enqueue_missing_addresses({order.address for order in orders}, GeocoderTask.DELIVERY)
+    transaction.on_commit(partial(update_order_candidates, orders))
+    return orders
+
+
+class InvalidRecord:
+    def __init__(self, errors):
+        self.errors = errors
+
+
+def iter_ndjson_records(lines):
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            yield InvalidRecord({'non_field_errors': [f'Некорректный JSON: {error}']})
+
+
+def import_orders(records, chunk_size):
+    # Yields a result for every record in the input order. Valid orders are
+    # written in chunks, one transaction per chunk
+    records = enumerate(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+
+        results = []
+        validated_orders = []
+        for index, record in chunk:
+            if isinstance(record, InvalidRecord):
+                results.append({'index': index, 'errors': record.errors})
+                continue
+            serializer = OrderSerializer(data=record)
+            if serializer.is_valid():
+                results.append({'index': index})
+                validated_orders.append(serializer.validated_data)
+            else:
+                results.append({'index': index, 'errors': serializer.errors})
+
+        with transaction.atomic():
+            orders = iter(create_orders(validated_orders))
+        for result in results:
+            if 'errors' not in result:
+                result['order_id'] = next(orders).id
+        yield from results
+
+
+def dump_order_payload(validated_order):
+    # The price is fixed at intake, as if the order was created right away
+    return {
+        'firstname': validated_order['firstname'],
+        'lastname': validated_order['lastname'],
+        'address': validated_order['address'],
+        'phonenumber': str(validated_order['phonenumber']),
+        'products': [
+            {
+                'product': product['product'].id,
+                'price': str(product['product'].price),
+                'quantity': product['quantity'],
+            }
+            for product in validated_order['products']
+        ],
+    }
+
+
+def load_order_payload(payload, registered_at):
+    return {
+        **payload,
+        'phonenumber': normalize_phonenumber(payload['phonenumber']),
+        'registered_at': registered_at,
+        'products': [
+            {
+                'product': Product(id=product['product'], price=Decimal(product['price'])),
+                'quantity': product['quantity'],
+            }
+            for product in payload['products']
+        ],
+    }
+
+
+def queue_order(validated_order, idempotency_key=None, request_fingerprint=''):
+    return QueuedOrder.objects.create(
+        payload=dump_order_payload(validated_order),
+        idempotency_key=idempotency_key,
+        request_fingerprint=request_fingerprint,
+    )
+
+
+def process_queued_orders(batch_size):
+    with transaction.atomic():
+        queued_orders = list(
+            QueuedOrder.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=QueuedOrder.QUEUED)
+            .order_by('id')[:batch_size]
+        )
+        if not queued_orders:
+            return 0
+
+        product_ids = {
+            product['product']
+            for queued_order in queued_orders
+            for product in queued_order.payload['products']
+        }
+        existing_product_ids = set(
+            Product.objects.filter(pk__in=product_ids).values_list('id', flat=True)
+        )
+        accepted_orders = []
+        for queued_order in queued_orders:
+            queued_order.processed_at = timezone.now()
+            missing_product_ids = [
+                product['product'] for product in queued_order.payload['products']
+                if product['product'] not in existing_product_ids
+            ]
+            if missing_product_ids:
+                queued_order.status = QueuedOrder.FAILED
+                queued_order.error = f'Товары удалены: {missing_product_ids}'
+            else:
+                accepted_orders.append(queued_order)
+
+        orders = create_orders([
+            load_order_payload(queued_order.payload, queued_order.queued_at)
+            for queued_order in accepted_orders
+        ])
+        for queued_order, order in zip(accepted_orders, orders):
+            queued_order.status = QueuedOrder.CREATED
+            queued_order.order = order
+
+        QueuedOrder.objects.bulk_update(
+            queued_orders, ['status', 'order', 'error', 'processed_at']
+        )
+    return len(queued_orders)
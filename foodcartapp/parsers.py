@@ -0,0 +1,11 @@
+from rest_framework.parsers import BaseParser
+
+from .orders import iter_ndjson_records
+
+
+class NDJSONParser(BaseParser):
+    # Records are parsed lazily, line by line, while the view consumes them
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter_ndjson_records(stream)
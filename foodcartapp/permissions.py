@@ -0,0 +1,8 @@
+from rest_framework.permissions import BasePermission
+
+
+class CanImportOrders(BasePermission):
+    # Aggregators get their own user with the permission to add orders and
+    # sign requests with HTTP Basic authentication
+    def has_permission(self, request, view):
+        return request.user.has_perm('foodcartapp.add_order')
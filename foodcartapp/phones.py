@@ -0,0 +1,59 @@
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from phonenumber_field.phonenumber import PhoneNumber
+from phonenumbers import NumberParseException
+
+DEFAULT_PHONE_REGION = 'RU'
+
+
+class InvalidPhoneNumber(ValueError):
+    pass
+
+
+def parse_phonenumber(value, region):
+    try:
+        phone_number = PhoneNumber.from_string(value, region=region)
+    except NumberParseException:
+        return None
+    if not phone_number.is_valid():
+        return None
+    return phone_number
+
+
+cached_parse_phonenumber = None
+cached_parse_phonenumber_lock = threading.Lock()
+
+
+def get_cached_parse_phonenumber():
+    # The cache is built once settings are loaded, afterwards it is read
+    # without taking the lock
+    global cached_parse_phonenumber
+    if cached_parse_phonenumber is not None:
+        return cached_parse_phonenumber
+    with cached_parse_phonenumber_lock:
+        if cached_parse_phonenumber is None:
+            cached_parse_phonenumber = lru_cache(
+                maxsize=settings.PHONENUMBER_CACHE_SIZE
+            )(parse_phonenumber)
+        return cached_parse_phonenumber
+
+
+def normalize_phonenumber(value, region=DEFAULT_PHONE_REGION):
+    # The returned PhoneNumber is shared by all callers with the same input
+    # and must not be modified
+    phone_number = get_cached_parse_phonenumber()(str(value).strip(), region)
+    if phone_number is None:
+        raise InvalidPhoneNumber(value)
+    return phone_number
+
+
+def get_phonenumber_cache_stats():
+    cache_info = get_cached_parse_phonenumber().cache_info()
+    return {
+        'hits': cache_info.hits,
+        'misses': cache_info.misses,
+        'size': cache_info.currsize,
+        'max_size': cache_info.maxsize,
+    }
@@ -0,0 +1,60 @@
+import datetime
+import decimal
+import json
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.functional import Promise
+from phonenumber_field.phonenumber import PhoneNumber
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_json_default(value):
+    # Decimal prices stay strings, as DjangoJSONEncoder and DRF render them
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, PhoneNumber):
+        return value.as_e164
+    if isinstance(value, Promise):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def encode_json_default_stdlib(value):
+    # orjson encodes these natively, the fallback renders them the same way
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return encode_json_default(value)
+
+
+def dumps_json(data):
+    if orjson is not None and settings.JSON_BACKEND == 'orjson':
+        return orjson.dumps(data, default=encode_json_default)
+    return json.dumps(
+        data, default=encode_json_default_stdlib, ensure_ascii=False, separators=(',', ':')
+    ).encode()
+
+
+class FastJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps_json(data)
+
+
+class FastJsonResponse(HttpResponse):
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps_json(data), **kwargs)
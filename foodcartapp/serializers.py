@@ -0,0 +1,96 @@
+from collections.abc import Mapping
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.serializers import CharField
+from rest_framework.serializers import ListSerializer
+from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import PrimaryKeyRelatedField
+from rest_framework.serializers import ValidationError
+
+from .models import Order
+from .models import OrderItem
+from .models import Product
+from .phones import InvalidPhoneNumber
+from .phones import normalize_phonenumber
+
+
+class BulkPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    # Looks objects up in the batch that the list serializer fetched for all
+    # items at once, failing with the same errors as PrimaryKeyRelatedField
+    def get_bulk_objects(self):
+        list_serializer = getattr(self.parent, 'parent', None)
+        return getattr(list_serializer, 'bulk_objects', {}).get(self.field_name)
+
+    def to_internal_value(self, data):
+        bulk_objects = self.get_bulk_objects()
+        if bulk_objects is None or self.pk_field is not None:
+            return super().to_internal_value(data)
+        try:
+            pk = to_pk(self.get_queryset(), data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in bulk_objects:
+            self.fail('does_not_exist', pk_value=data)
+        return bulk_objects[pk]
+
+
+def to_pk(queryset, data):
+    if isinstance(data, bool):
+        raise TypeError
+    try:
+        return queryset.model._meta.pk.to_python(data)
+    except DjangoValidationError:
+        raise ValueError
+
+
+class BulkRelatedListSerializer(ListSerializer):
+    def fetch_bulk_objects(self, data):
+        self.bulk_objects = {}
+        if not isinstance(data, list):
+            return
+        for field_name, field in self.child.fields.items():
+            if not isinstance(field, BulkPrimaryKeyRelatedField):
+                continue
+            queryset = field.get_queryset()
+            pks = set()
+            for item in data:
+                if not isinstance(item, Mapping) or field_name not in item:
+                    continue
+                try:
+                    pks.add(to_pk(queryset, item[field_name]))
+                except (TypeError, ValueError):
+                    continue
+            self.bulk_objects[field_name] = queryset.in_bulk(pks)
+
+    def to_internal_value(self, data):
+        self.fetch_bulk_objects(data)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            del self.bulk_objects
+
+
+class OrderItemSerializer(ModelSerializer):
+    product = BulkPrimaryKeyRelatedField(
+        queryset=Product.objects.only('id', 'price')
+    )
+
+    class Meta:
+        model = OrderItem
+        fields = ['product', 'quantity']
+        list_serializer_class = BulkRelatedListSerializer
+
+
+class OrderSerializer(ModelSerializer):
+    products = OrderItemSerializer(many=True, allow_empty=False, write_only=True)
+    phonenumber = CharField()
+
+    class Meta:
+        model = Order
+        fields = ['products', 'firstname', 'lastname', 'address', 'phonenumber']
+
+    def validate_phonenumber(self, value):
+        try:
+            return normalize_phonenumber(value)
+        except InvalidPhoneNumber:
+            raise ValidationError('Некорректный номер телефона')
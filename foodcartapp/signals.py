@@ -0,0 +1,128 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from location.geocoding import enqueue_restaurant_address
+from location.models import DeliveryLocation
+from location.models import RestaurantLocation
+
+from .availability import reset_availability_index
+from .banners import banners_store
+from .candidates import outdate_orders_with_addresses
+from .candidates import outdate_orders_with_products
+from .candidates import outdate_orders_with_restaurants
+from .catalog import catalog_store
+from .images import generate_derivatives
+from .models import Banner
+from .models import OrderItem
+from .models import Product
+from .models import ProductCategory
+from .models import Restaurant
+from .models import RestaurantMenuItem
+from .models import menu_items_changed
+from .models import update_orders_total_price
+
+
+@receiver(post_save, sender=Restaurant)
+def enqueue_restaurant_geocoding(sender, instance, **kwargs):
+    enqueue_restaurant_address(instance.address)
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def invalidate_availability_index(sender, **kwargs):
+    transaction.on_commit(reset_availability_index)
+
+
+@receiver(post_delete, sender=RestaurantMenuItem)
+def update_deleted_menu_item_product_availability(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).update_available_restaurant_count()
+
+
+@receiver(pre_delete, sender=Product)
+def update_deleted_product_orders_total_price(sender, instance, **kwargs):
+    # Order items of the product are deleted by the cascade, bypassing
+    # OrderItem.delete()
+    order_ids = list(
+        OrderItem.objects
+        .filter(product=instance)
+        .values_list('order_id', flat=True)
+        .distinct()
+    )
+    if order_ids:
+        transaction.on_commit(partial(update_orders_total_price, order_ids))
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def invalidate_product_orders_candidates(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(outdate_orders_with_products, [instance.product_id])
+    )
+
+
+@receiver(menu_items_changed, sender=RestaurantMenuItem)
+def invalidate_changed_menu_items(sender, product_ids, **kwargs):
+    transaction.on_commit(reset_availability_index)
+    transaction.on_commit(catalog_store.bump_version)
+    transaction.on_commit(
+        partial(outdate_orders_with_products, list(product_ids))
+    )
+
+
+@receiver(post_save, sender=Restaurant)
+def invalidate_restaurant_orders_candidates(sender, instance, created, **kwargs):
+    if created:
+        return
+    transaction.on_commit(
+        partial(outdate_orders_with_restaurants, [instance.id])
+    )
+
+
+@receiver(post_save, sender=RestaurantLocation)
+def invalidate_restaurant_location_orders_candidates(sender, instance, **kwargs):
+    restaurant_ids = list(
+        Restaurant.objects
+        .filter(address=instance.address)
+        .values_list('id', flat=True)
+    )
+    transaction.on_commit(
+        partial(outdate_orders_with_restaurants, restaurant_ids)
+    )
+
+
+@receiver(post_save, sender=DeliveryLocation)
+def invalidate_delivery_location_orders_candidates(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(outdate_orders_with_addresses, [instance.address])
+    )
+
+
+# Connected before invalidate_catalog, so the rebuilt catalog already
+# lists the new derivatives in srcset
+@receiver(post_save, sender=Product)
+def generate_product_image_derivatives(sender, instance, **kwargs):
+    if instance.image:
+        transaction.on_commit(partial(generate_derivatives, instance.image.name))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(catalog_store.bump_version)
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def invalidate_banners(sender, **kwargs):
+    transaction.on_commit(banners_store.bump_version)
@@ -0,0 +1,147 @@
+import gzip
+import hashlib
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.http import HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.http import parse_etags
+from django.utils.http import parse_http_date_safe
+
+from .versions import VersionCounter
+from .versions import get_version_timestamp
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Snapshot:
+    def __init__(self, content, version, expires_at=None, last_changed_at=None):
+        self.version = version
+        self.expires_at = expires_at
+        self.content = content
+        self.gzip_content = gzip.compress(content, mtime=0)
+        self.brotli_content = brotli.compress(content) if brotli else None
+        self.content_hash = hashlib.sha256(content).hexdigest()[:32]
+        # Taken from shared data only, so every process reports the same
+        # Last-Modified for the same content
+        self.last_modified = get_version_timestamp(version)
+        if last_changed_at is not None:
+            self.last_modified = max(self.last_modified, int(last_changed_at.timestamp()))
+
+    def is_expired(self):
+        return self.expires_at is not None and timezone.now() >= self.expires_at
+
+    def is_actual(self, version):
+        return self.version == version and not self.is_expired()
+
+    def get_encoded_content(self, accepted_encodings):
+        if self.brotli_content is not None and 'br' in accepted_encodings:
+            return self.brotli_content, 'br'
+        if 'gzip' in accepted_encodings:
+            return self.gzip_content, 'gzip'
+        return self.content, None
+
+    def get_etag(self, encoding):
+        # Every encoding is a separate representation with its own strong tag
+        if encoding:
+            return f'"{self.content_hash}-{encoding}"'
+        return f'"{self.content_hash}"'
+
+    def is_not_modified(self, request):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            if '*' in etags:
+                return True
+            return any(get_etag_hash(etag) == self.content_hash for etag in etags)
+
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', '')
+        )
+        return if_modified_since is not None and self.last_modified <= if_modified_since
+
+
+def get_etag_hash(etag):
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    return etag.strip('"').partition('-')[0]
+
+
+def get_snapshot_version_check_interval():
+    return settings.SNAPSHOT_VERSION_CHECK_INTERVAL
+
+
+class SnapshotStore:
+    # Keeps the last built snapshot in process memory. Other processes learn
+    # that it is outdated through the version counter in the shared cache,
+    # read at most once per SNAPSHOT_VERSION_CHECK_INTERVAL seconds.
+    # Content that changes with time reports when it expires through
+    # get_expiration and when it last changed through get_last_change
+    def __init__(self, version_cache_key, build_content, get_expiration=None,
+                 get_last_change=None):
+        self.version = VersionCounter(
+            version_cache_key, get_snapshot_version_check_interval
+        )
+        self.build_content = build_content
+        self.get_expiration = get_expiration
+        self.get_last_change = get_last_change
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def get_version(self):
+        return self.version.get()
+
+    def bump_version(self):
+        self.version.bump()
+
+    def get_snapshot(self):
+        version = self.get_version()
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.is_actual(version):
+            return snapshot
+        with self.lock:
+            if self.snapshot is None or not self.snapshot.is_actual(version):
+                self.snapshot = self.rebuild_snapshot(version)
+            return self.snapshot
+
+    def rebuild_snapshot(self, version):
+        expires_at = self.get_expiration() if self.get_expiration else None
+        last_changed_at = self.get_last_change() if self.get_last_change else None
+        return Snapshot(self.build_content(), version, expires_at, last_changed_at)
+
+
+def get_accepted_encodings(request):
+    accepted_encodings = set()
+    for accepted_encoding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        encoding, *params = accepted_encoding.split(';')
+        quality = 1
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if quality > 0:
+            accepted_encodings.add(encoding.strip().lower())
+    return accepted_encodings
+
+
+def get_snapshot_response(request, snapshot, cache_control):
+    content, encoding = snapshot.get_encoded_content(get_accepted_encodings(request))
+    if snapshot.is_not_modified(request):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    response['ETag'] = snapshot.get_etag(encoding)
+    response['Last-Modified'] = http_date(snapshot.last_modified)
+    response['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1,1066 @@
+import gzip
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+from unittest import skipUnless
+
+from django.contrib.auth.models import Permission
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.http import parse_http_date
+from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import PrimaryKeyRelatedField
+
+from foodcartapp.availability import AvailabilityIndex
+from foodcartapp.availability import build_availability_index
+from foodcartapp.availability import get_availability_index
+from foodcartapp.availability import reset_availability_index
+from foodcartapp.banners import banners_store
+from foodcartapp.candidates import update_outdated_order_candidates
+from foodcartapp.catalog import catalog_store
+from foodcartapp.models import Banner
+from foodcartapp.models import IdempotencyKey
+from foodcartapp.models import Order
+from foodcartapp.models import OrderCandidate
+from foodcartapp.models import OrderItem
+from foodcartapp.models import Product
+from foodcartapp.models import ProductCategory
+from foodcartapp.models import QueuedOrder
+from foodcartapp.models import Restaurant
+from foodcartapp.models import RestaurantMenuItem
+from foodcartapp.orders import create_orders
+from foodcartapp.orders import process_queued_orders
+from foodcartapp.phones import normalize_phonenumber
+from foodcartapp.serializers import OrderItemSerializer
+from foodcartapp.serializers import OrderSerializer
+from foodcartapp.snapshots import brotli
+from location.models import DeliveryLocation
+from location.models import RestaurantLocation
+
+
+class OrderAdminSaveFormsetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.products = [
+            Product.objects.create(name=f'Бургер {number}', price=number + 1, category=category)
+            for number in range(12)
+        ]
+        cls.user = User.objects.create_superuser('manager', 'manager@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_order(self, items_count):
+        order = Order.objects.create(
+            address='Москва, Тверская, 1',
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79991234567',
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, total_price=0)
+            for product in self.products[:items_count]
+        ])
+        return order
+
+    def get_change_form_data(self, order, new_product):
+        order_items = list(order.items.order_by('id'))
+        data = {
+            'address': order.address,
+            'firstname': order.firstname,
+            'lastname': order.lastname,
+            'phonenumber': str(order.phonenumber),
+            'comment': '',
+            'status': order.status,
+            'payment_method': 'Cash',
+            'items-TOTAL_FORMS': len(order_items) + 1,
+            'items-INITIAL_FORMS': len(order_items),
+            'items-MIN_NUM_FORMS': 0,
+            'items-MAX_NUM_FORMS': 1000,
+        }
+        for number, order_item in enumerate(order_items):
+            data.update({
+                f'items-{number}-id': order_item.id,
+                f'items-{number}-order': order.id,
+                f'items-{number}-product': order_item.product_id,
+                f'items-{number}-quantity': 3,
+                f'items-{number}-total_price': 0,
+            })
+        data.update({
+            f'items-{len(order_items)}-order': order.id,
+            f'items-{len(order_items)}-product': new_product.id,
+            f'items-{len(order_items)}-quantity': 2,
+            f'items-{len(order_items)}-total_price': 0,
+        })
+        return data
+
+    def save_order(self, order):
+        url = reverse('admin:foodcartapp_order_change', args=(order.id,))
+        data = self.get_change_form_data(order, self.products[-1])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        return [query['sql'] for query in context.captured_queries]
+
+    def count_queries(self, queries, prefix):
+        return sum(query.startswith(prefix) for query in queries)
+
+    def test_items_are_priced_and_written_in_bulk(self):
+        order = self.create_order(10)
+        queries = self.save_order(order)
+
+        self.assertEqual(self.count_queries(queries, 'SELECT "foodcartapp_product"."id"'), 1)
+        self.assertEqual(self.count_queries(queries, 'UPDATE "foodcartapp_orderitem"'), 1)
+        self.assertEqual(self.count_queries(queries, 'INSERT INTO "foodcartapp_orderitem"'), 1)
+
+        order_items = list(order.items.select_related('product').order_by('id'))
+        self.assertEqual(len(order_items), 11)
+        for order_item in order_items:
+            self.assertEqual(order_item.total_price, order_item.product.price * order_item.quantity)
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, sum(order_item.total_price for order_item in order_items))
+
+    def test_write_queries_do_not_grow_with_items(self):
+        small_order_queries = self.save_order(self.create_order(2))
+        large_order_queries = self.save_order(self.create_order(10))
+
+        for prefix in ['UPDATE', 'INSERT', 'DELETE', 'SELECT "foodcartapp_product"."id"']:
+            self.assertEqual(
+                self.count_queries(small_order_queries, prefix),
+                self.count_queries(large_order_queries, prefix),
+            )
+
+
+class OrderChangelistTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.product = Product.objects.create(name='Бургер', price=100, category=category)
+        cls.user = User.objects.create_superuser('manager', 'manager@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_orders(self, orders_count):
+        for _ in range(orders_count):
+            order = Order.objects.create(
+                address='Москва, Тверская, 1',
+                firstname='Иван',
+                lastname='Петров',
+                phonenumber='+79991234567',
+            )
+            OrderItem.objects.create(order=order, product=self.product, quantity=1, total_price=100)
+
+    def get_queries_count(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        for url in [
+            reverse('admin:foodcartapp_order_changelist'),
+            reverse('admin:foodcartapp_orderitem_changelist'),
+        ]:
+            with self.subTest(url=url):
+                self.create_orders(2)
+                small_changelist_queries = self.get_queries_count(url)
+                self.create_orders(10)
+                self.assertEqual(self.get_queries_count(url), small_changelist_queries)
+
+
+class OrderTotalPriceTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.products = [
+            Product.objects.create(name=f'Бургер {number}', price=10, category=category)
+            for number in range(2)
+        ]
+
+    def create_order(self):
+        order = Order.objects.create(
+            address='Москва, Тверская, 1',
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79991234567',
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, total_price=product.price)
+            for product in self.products * 5
+        ])
+        return order
+
+    def test_deleted_items_are_subtracted(self):
+        order = self.create_order()
+        order.items.filter(product=self.products[0]).delete()
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, 50)
+
+        order.items.first().delete()
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, 40)
+
+    def test_order_items_are_fast_deleted(self):
+        order = self.create_order()
+        with CaptureQueriesContext(connection) as context:
+            order.delete()
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertFalse(any(query.startswith('UPDATE') for query in queries))
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_created_orders_are_not_recounted(self):
+        validated_order = {
+            'address': 'Москва, Тверская, 1',
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': normalize_phonenumber('+79991234567'),
+            'products': [
+                {'product': product, 'quantity': 3}
+                for product in self.products
+            ],
+        }
+        with CaptureQueriesContext(connection) as context:
+            order, = create_orders([validated_order])
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertFalse(any(query.startswith('UPDATE') for query in queries))
+
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, 60)
+        self.assertEqual(order.items.count(), 2)
+
+
+class PhonenumberCacheViewTest(TestCase):
+    def test_stats_are_shown_to_staff(self):
+        user = User.objects.create_superuser('manager', 'manager@example.com', 'password')
+        self.client.force_login(user)
+        normalize_phonenumber('+7 999 765-43-21')
+        normalize_phonenumber('+7 999 765-43-21')
+
+        response = self.client.get(reverse('admin:foodcartapp_order_phonenumber_cache'))
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        self.assertGreaterEqual(stats['hits'], 1)
+        self.assertGreaterEqual(stats['size'], 1)
+
+    def test_stats_are_hidden_from_anonymous_users(self):
+        response = self.client.get(reverse('admin:foodcartapp_order_phonenumber_cache'))
+        self.assertEqual(response.status_code, 302)
+
+
+class CatalogSnapshotViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        product = Product.objects.create(
+            name='Бургер', price=100, category=category, image='burger.jpg'
+        )
+        restaurant = Restaurant.objects.create(name='Star Burger', address='Москва')
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=product)
+
+    def setUp(self):
+        # Receivers bump the version after a commit, and test cases never commit
+        catalog_store.bump_version()
+
+    def get_catalog(self, **headers):
+        return self.client.get('/api/products/', **headers)
+
+    def test_every_encoding_has_own_etag(self):
+        response = self.get_catalog()
+        gzip_response = self.get_catalog(HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(gzip_response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(gzip_response.content), response.content)
+        self.assertEqual(gzip_response['ETag'], response['ETag'][:-1] + '-gzip"')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip_response['Vary'], 'Accept-Encoding')
+
+    @skipUnless(brotli, 'brotli is not installed')
+    def test_brotli_is_preferred(self):
+        response = self.get_catalog(HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.get_catalog().content)
+
+    def test_encoding_with_zero_quality_is_not_used(self):
+        response = self.get_catalog(HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertNotIn('-gzip', response['ETag'])
+
+    def test_if_none_match(self):
+        etag = self.get_catalog()['ETag']
+        for if_none_match in [
+            etag,
+            f'W/{etag}',
+            etag[:-1] + '-gzip"',
+            f'"other", {etag}',
+            '*',
+        ]:
+            with self.subTest(if_none_match=if_none_match):
+                response = self.get_catalog(HTTP_IF_NONE_MATCH=if_none_match)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+
+        response = self.get_catalog(HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_none_match_takes_precedence_over_if_modified_since(self):
+        last_modified = self.get_catalog()['Last-Modified']
+        response = self.get_catalog(
+            HTTP_IF_NONE_MATCH='"other"', HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        response = self.get_catalog()
+        last_modified = parse_http_date(response['Last-Modified'])
+
+        response = self.get_catalog(HTTP_IF_MODIFIED_SINCE=http_date(last_modified))
+        self.assertEqual(response.status_code, 304)
+        response = self.get_catalog(HTTP_IF_MODIFIED_SINCE=http_date(last_modified - 1))
+        self.assertEqual(response.status_code, 200)
+        response = self.get_catalog(HTTP_IF_MODIFIED_SINCE='not a date')
+        self.assertEqual(response.status_code, 200)
+
+    def test_last_modified_moves_with_version(self):
+        last_modified = parse_http_date(self.get_catalog()['Last-Modified'])
+        catalog_store.bump_version()
+        response = self.get_catalog(HTTP_IF_MODIFIED_SINCE=http_date(last_modified))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(parse_http_date(response['Last-Modified']), last_modified)
+
+    def test_steady_state_runs_no_queries(self):
+        etag = self.get_catalog()['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_catalog().status_code, 200)
+            response = self.get_catalog(HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+
+class CatalogSnapshotVersionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.product = Product.objects.create(
+            name='Бургер', price=100, category=category, image='burger.jpg'
+        )
+        restaurant = Restaurant.objects.create(name='Star Burger', address='Москва')
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=cls.product)
+
+    def setUp(self):
+        catalog_store.bump_version()
+
+    def rename_product(self, name):
+        # update() sends no signals, as if another process changed the product
+        Product.objects.filter(pk=self.product.pk).update(name=name)
+
+    def bump_version_in_other_process(self):
+        cache.set(catalog_store.version.cache_key, catalog_store.get_version() + 10 ** 9, None)
+
+    def test_snapshot_is_rebuilt_after_bump(self):
+        self.client.get('/api/products/')
+        self.rename_product('Чизбургер')
+        self.assertEqual(self.client.get('/api/products/').json()[0]['name'], 'Бургер')
+
+        catalog_store.bump_version()
+        self.assertEqual(self.client.get('/api/products/').json()[0]['name'], 'Чизбургер')
+
+    @override_settings(SNAPSHOT_VERSION_CHECK_INTERVAL=3600)
+    def test_shared_version_is_checked_once_per_interval(self):
+        self.client.get('/api/products/')
+        self.rename_product('Чизбургер')
+        self.bump_version_in_other_process()
+        self.assertEqual(self.client.get('/api/products/').json()[0]['name'], 'Бургер')
+
+    @override_settings(SNAPSHOT_VERSION_CHECK_INTERVAL=0)
+    def test_bump_in_other_process_is_seen_after_interval(self):
+        self.client.get('/api/products/')
+        self.rename_product('Чизбургер')
+        self.bump_version_in_other_process()
+        self.assertEqual(self.client.get('/api/products/').json()[0]['name'], 'Чизбургер')
+
+
+class BannersViewTest(TestCase):
+    def setUp(self):
+        banners_store.bump_version()
+
+    def get_banners(self):
+        return self.client.get('/api/banners/').json()
+
+    def test_default_banners_are_shown_without_banners_in_db(self):
+        banners = self.get_banners()
+        self.assertEqual([banner['title'] for banner in banners], ['Burger', 'Spices', 'New York'])
+        self.assertEqual(banners[0]['src'], '/static/burger.jpg')
+
+    def test_active_banners_replace_default_ones(self):
+        Banner.objects.create(title='Акция', image='banners/sale.jpg', position=1)
+        Banner.objects.create(title='Новинка', image='banners/new.jpg', position=0)
+        Banner.objects.create(
+            title='Прошедшая акция',
+            image='banners/old.jpg',
+            active_until=timezone.now() - timedelta(days=1),
+        )
+        banners_store.bump_version()
+
+        self.assertEqual(
+            self.get_banners(),
+            [
+                {'title': 'Новинка', 'src': '/media/banners/new.jpg', 'text': ''},
+                {'title': 'Акция', 'src': '/media/banners/sale.jpg', 'text': ''},
+            ]
+        )
+
+    def test_no_default_banners_when_all_banners_are_inactive(self):
+        Banner.objects.create(
+            title='Будущая акция',
+            image='banners/sale.jpg',
+            active_from=timezone.now() + timedelta(days=1),
+        )
+        banners_store.bump_version()
+        self.assertEqual(self.get_banners(), [])
+
+    def test_scheduled_banner_appears_without_bump(self):
+        active_from = timezone.now() + timedelta(days=1)
+        Banner.objects.create(title='Акция', image='banners/sale.jpg', active_from=active_from)
+        banners_store.bump_version()
+        self.assertEqual(self.get_banners(), [])
+
+        with mock.patch('django.utils.timezone.now', return_value=active_from):
+            response = self.client.get('/api/banners/')
+        self.assertEqual([banner['title'] for banner in response.json()], ['Акция'])
+        self.assertEqual(parse_http_date(response['Last-Modified']), int(active_from.timestamp()))
+
+    def test_steady_state_runs_no_queries(self):
+        etag = self.client.get('/api/banners/')['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/banners/').status_code, 200)
+            response = self.client.get('/api/banners/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+
+class ImportOrdersApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.burger = Product.objects.create(name='Бургер', price=100, category=category)
+        cls.fries = Product.objects.create(name='Картошка', price='45.50', category=category)
+        cls.user = User.objects.create_user('aggregator', password='password')
+        cls.user.user_permissions.add(Permission.objects.get(codename='add_order'))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get_order_data(self, firstname='Иван', **fields):
+        return {
+            'products': [
+                {'product': self.burger.id, 'quantity': 2},
+                {'product': self.fries.id, 'quantity': 1},
+            ],
+            'firstname': firstname,
+            'lastname': 'Петров',
+            'address': 'Москва, Тверская, 1',
+            'phonenumber': '+79991234567',
+            **fields,
+        }
+
+    def import_orders(self, orders):
+        return self.client.post(
+            '/api/orders/import/', json.dumps(orders), content_type='application/json'
+        )
+
+    def test_anonymous_user_can_not_import(self):
+        self.client.logout()
+        response = self.import_orders([self.get_order_data()])
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Order.objects.exists())
+
+    def test_user_without_permission_can_not_import(self):
+        user = User.objects.create_user('client', password='password')
+        self.client.force_login(user)
+        response = self.import_orders([self.get_order_data()])
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Order.objects.exists())
+
+    def test_json_array_with_invalid_orders(self):
+        response = self.import_orders([
+            self.get_order_data('Иван'),
+            self.get_order_data('Пётр', phonenumber='123'),
+            self.get_order_data('Анна', products=[]),
+            self.get_order_data('Мария'),
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['imported'], 2)
+        self.assertEqual(result['failed'], 2)
+        self.assertEqual([item['index'] for item in result['results']], [0, 1, 2, 3])
+        self.assertIn('phonenumber', result['results'][1]['errors'])
+        self.assertIn('products', result['results'][2]['errors'])
+        for index, firstname in [(0, 'Иван'), (3, 'Мария')]:
+            order = Order.objects.get(pk=result['results'][index]['order_id'])
+            self.assertEqual(order.firstname, firstname)
+            self.assertEqual(order.total_price, 245.5)
+
+    def test_ndjson(self):
+        lines = [
+            json.dumps(self.get_order_data('Иван')),
+            '',
+            '{"broken": ',
+            json.dumps(self.get_order_data('Мария')),
+        ]
+        response = self.client.post(
+            '/api/orders/import/', '\n'.join(lines), content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result['imported'], result['failed']), (2, 1))
+        self.assertIn('Некорректный JSON', result['results'][1]['errors']['non_field_errors'][0])
+        self.assertEqual(
+            list(Order.objects.order_by('id').values_list('firstname', flat=True)),
+            ['Иван', 'Мария'],
+        )
+
+    def test_body_must_be_a_list(self):
+        response = self.import_orders(self.get_order_data())
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    @override_settings(ORDERS_IMPORT_CHUNK_SIZE=2)
+    def test_orders_are_written_in_chunks(self):
+        firstnames = ['Иван', 'Пётр', 'Анна', 'Мария', 'Ольга']
+        with mock.patch('foodcartapp.orders.create_orders', wraps=create_orders) as create_orders_mock:
+            response = self.import_orders([
+                self.get_order_data(firstname) for firstname in firstnames
+            ])
+
+        self.assertEqual(create_orders_mock.call_count, 3)
+        self.assertEqual(
+            [len(call.args[0]) for call in create_orders_mock.call_args_list], [2, 2, 1]
+        )
+        for firstname, item in zip(firstnames, response.json()['results']):
+            self.assertEqual(Order.objects.get(pk=item['order_id']).firstname, firstname)
+
+    def test_imported_order_is_identical_to_registered_one(self):
+        order_data = self.get_order_data()
+        self.client.post('/api/order/', json.dumps(order_data), content_type='application/json')
+        self.import_orders([order_data])
+
+        registered_order, imported_order = Order.objects.order_by('id')
+        excluded_fields = {'id', 'registered_at'}
+        for field in Order._meta.concrete_fields:
+            if field.name in excluded_fields:
+                continue
+            with self.subTest(field=field.name):
+                self.assertEqual(
+                    getattr(registered_order, field.attname),
+                    getattr(imported_order, field.attname),
+                )
+        self.assertEqual(
+            list(registered_order.items.values_list('product', 'quantity', 'total_price')),
+            list(imported_order.items.values_list('product', 'quantity', 'total_price')),
+        )
+
+
+class IdempotencyKeyTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.product = Product.objects.create(name='Бургер', price=100, category=category)
+
+    def get_order_data(self, quantity=1):
+        return {
+            'products': [{'product': self.product.id, 'quantity': quantity}],
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'address': 'Москва, Тверская, 1',
+            'phonenumber': '+79991234567',
+        }
+
+    def register_order(self, order_data, key='key-1'):
+        return self.client.post(
+            '/api/order/', json.dumps(order_data),
+            content_type='application/json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_repeated_request_is_replayed(self):
+        response = self.register_order(self.get_order_data())
+        replayed_response = self.register_order(self.get_order_data())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(replayed_response.status_code, 200)
+        self.assertEqual(replayed_response['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed_response.json(), response.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_replay_is_not_changed_by_order_edits(self):
+        response = self.register_order(self.get_order_data())
+        Order.objects.update(firstname='Пётр', address='Москва, Арбат, 1')
+
+        replayed_response = self.register_order(self.get_order_data())
+        self.assertEqual(replayed_response.json(), response.json())
+        self.assertEqual(replayed_response.json()['firstname'], 'Иван')
+
+    def test_other_order_with_same_key_is_rejected(self):
+        self.register_order(self.get_order_data(quantity=1))
+        response = self.register_order(self.get_order_data(quantity=2))
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_key_can_be_reused(self):
+        self.register_order(self.get_order_data(quantity=1))
+        later = timezone.now() + timedelta(hours=25)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            response = self.register_order(self.get_order_data(quantity=2))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.get().order, Order.objects.latest('id'))
+
+    def test_concurrent_request_with_same_key_is_replayed(self):
+        response = self.register_order(self.get_order_data())
+        stored_key = IdempotencyKey.objects.get()
+
+        # The concurrent request checked the key before the first one stored it
+        with mock.patch(
+            'foodcartapp.views.get_stored_idempotency_key', side_effect=[None, stored_key]
+        ):
+            replayed_response = self.register_order(self.get_order_data())
+
+        self.assertEqual(replayed_response.status_code, 200)
+        self.assertEqual(replayed_response['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed_response.json(), response.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_invalid_key_is_rejected(self):
+        response = self.register_order(self.get_order_data(), key='k' * 256)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    @override_settings(ORDER_INTAKE_MODE='queued')
+    def test_queued_order_is_replayed(self):
+        response = self.register_order(self.get_order_data())
+        replayed_response = self.register_order(self.get_order_data())
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(replayed_response.status_code, 202)
+        self.assertEqual(replayed_response['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed_response.json(), response.json())
+        self.assertEqual(QueuedOrder.objects.count(), 1)
+
+        response = self.register_order(self.get_order_data(quantity=2))
+        self.assertEqual(response.status_code, 422)
+
+    @override_settings(ORDER_INTAKE_MODE='queued')
+    def test_queued_order_key_expires(self):
+        response = self.register_order(self.get_order_data(quantity=1))
+        later = timezone.now() + timedelta(hours=25)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            new_response = self.register_order(self.get_order_data(quantity=2))
+
+        self.assertEqual(new_response.status_code, 202)
+        self.assertNotEqual(new_response.json()['token'], response.json()['token'])
+        self.assertEqual(
+            QueuedOrder.objects.get(idempotency_key='key-1').token.hex,
+            new_response.json()['token'].replace('-', ''),
+        )
+
+    def test_purge_releases_expired_keys(self):
+        self.register_order(self.get_order_data(), key='key-1')
+        with override_settings(ORDER_INTAKE_MODE='queued'):
+            self.register_order(self.get_order_data(), key='key-2')
+
+        later = timezone.now() + timedelta(hours=25)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            call_command('purge_idempotency_keys', stdout=io.StringIO())
+
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertFalse(QueuedOrder.objects.filter(idempotency_key__isnull=False).exists())
+
+
+class ProductAvailabilityCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.burger = Product.objects.create(name='Бургер', price=100, category=category)
+        cls.fries = Product.objects.create(name='Картошка', price=50, category=category)
+        cls.restaurants = [
+            Restaurant.objects.create(name=f'Ресторан {number}', address=f'Москва, {number}')
+            for number in range(3)
+        ]
+
+    def assertCounts(self, burger_count, fries_count):
+        self.burger.refresh_from_db()
+        self.fries.refresh_from_db()
+        self.assertEqual(
+            (self.burger.available_restaurant_count, self.fries.available_restaurant_count),
+            (burger_count, fries_count),
+        )
+        self.assertFalse(Product.objects.with_outdated_available_restaurant_count().exists())
+
+    def create_menu_items(self, product, availability=True):
+        return RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(restaurant=restaurant, product=product, availability=availability)
+            for restaurant in self.restaurants
+        ])
+
+    def test_save(self):
+        menu_item = RestaurantMenuItem.objects.create(
+            restaurant=self.restaurants[0], product=self.burger
+        )
+        self.assertCounts(1, 0)
+
+        menu_item.availability = False
+        menu_item.save()
+        self.assertCounts(0, 0)
+
+        menu_item.availability = True
+        menu_item.product = self.fries
+        menu_item.save()
+        self.assertCounts(0, 1)
+
+    def test_delete(self):
+        menu_item = RestaurantMenuItem.objects.create(
+            restaurant=self.restaurants[0], product=self.burger
+        )
+        menu_item.delete()
+        self.assertCounts(0, 0)
+
+        self.create_menu_items(self.burger)
+        RestaurantMenuItem.objects.filter(restaurant=self.restaurants[0]).delete()
+        self.assertCounts(2, 0)
+
+    def test_queryset_update(self):
+        self.create_menu_items(self.burger)
+        RestaurantMenuItem.objects.filter(restaurant=self.restaurants[0]).update(availability=False)
+        self.assertCounts(2, 0)
+
+        RestaurantMenuItem.objects.filter(restaurant=self.restaurants[1]).update(product=self.fries)
+        self.assertCounts(1, 1)
+
+        RestaurantMenuItem.objects.filter(restaurant=self.restaurants[2]).update(
+            product_id=self.fries.id
+        )
+        self.assertCounts(0, 2)
+
+    def test_bulk_create(self):
+        self.create_menu_items(self.burger)
+        self.create_menu_items(self.fries, availability=False)
+        self.assertCounts(3, 0)
+
+    def test_bulk_update(self):
+        self.create_menu_items(self.burger)
+        menu_items = list(RestaurantMenuItem.objects.order_by('id'))
+        menu_items[0].availability = False
+        menu_items[1].product = self.fries
+        RestaurantMenuItem.objects.bulk_update(menu_items, ['availability', 'product'])
+        self.assertCounts(1, 1)
+
+    def test_restaurant_cascade(self):
+        self.create_menu_items(self.burger)
+        self.restaurants[0].delete()
+        self.assertCounts(2, 0)
+
+    def test_recount_command(self):
+        self.create_menu_items(self.burger)
+        Product.objects.filter(pk=self.burger.pk).update(available_restaurant_count=0)
+        Product.objects.filter(pk=self.fries.pk).update(available_restaurant_count=5)
+        catalog_store.bump_version()
+        catalog_version = catalog_store.get_version()
+
+        stdout = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('recount_product_availability', stdout=stdout)
+
+        self.assertIn('Исправлено товаров: 2', stdout.getvalue())
+        self.assertCounts(3, 0)
+        self.assertNotEqual(catalog_store.get_version(), catalog_version)
+
+
+class OrderCandidatesInvalidationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.burger = Product.objects.create(name='Бургер', price=100, category=category)
+        cls.fries = Product.objects.create(name='Картошка', price=50, category=category)
+        cls.first_restaurant = Restaurant.objects.create(name='Первый', address='Москва, Арбат, 1')
+        cls.second_restaurant = Restaurant.objects.create(name='Второй', address='Москва, Арбат, 2')
+
+        cls.burger_order = cls.create_order('Москва, Тверская, 1', cls.burger, cls.first_restaurant)
+        cls.fries_order = cls.create_order('Москва, Тверская, 2', cls.fries, cls.second_restaurant)
+        cls.finished_order = cls.create_order(
+            'Москва, Тверская, 2', cls.burger, cls.first_restaurant, status='FINISHED'
+        )
+        Order.objects.update(candidates_outdated=False)
+
+    @classmethod
+    def create_order(cls, address, product, candidate_restaurant, status='RAW'):
+        order = Order.objects.create(
+            address=address,
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79991234567',
+            status=status,
+        )
+        OrderItem.objects.create(order=order, product=product, quantity=1, total_price=product.price)
+        OrderCandidate.objects.create(order=order, restaurant=candidate_restaurant, rank=0)
+        return order
+
+    def get_outdated_orders(self):
+        return set(Order.objects.filter(candidates_outdated=True))
+
+    def test_menu_item_change_outdates_orders_with_product(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.create(restaurant=self.second_restaurant, product=self.burger)
+        self.assertEqual(self.get_outdated_orders(), {self.burger_order})
+
+    def test_bulk_menu_change_outdates_orders_with_product(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.bulk_create([
+                RestaurantMenuItem(restaurant=self.first_restaurant, product=self.fries)
+            ])
+        self.assertEqual(self.get_outdated_orders(), {self.fries_order})
+
+    def test_restaurant_location_change_outdates_its_candidate_orders(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantLocation.objects.create(
+                address=self.first_restaurant.address, lon=37.59, lat=55.75
+            )
+        self.assertEqual(self.get_outdated_orders(), {self.burger_order})
+
+    def test_delivery_location_change_outdates_orders_with_address(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            DeliveryLocation.objects.create(address=self.fries_order.address, lon=37.6, lat=55.76)
+        self.assertEqual(self.get_outdated_orders(), {self.fries_order})
+
+    def test_outdated_orders_are_ranked_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.create(restaurant=self.second_restaurant, product=self.burger)
+            RestaurantMenuItem.objects.create(
+                restaurant=self.first_restaurant, product=self.burger, availability=False
+            )
+
+        self.assertEqual(update_outdated_order_candidates(10), 1)
+        self.assertFalse(self.get_outdated_orders())
+        self.assertEqual(
+            list(self.burger_order.candidates.values_list('restaurant', flat=True)),
+            [self.second_restaurant.id],
+        )
+        self.assertEqual(
+            list(self.fries_order.candidates.values_list('restaurant', flat=True)),
+            [self.second_restaurant.id],
+        )
+
+
+class AvailabilityIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.burger, cls.fries, cls.cola = [
+            Product.objects.create(name=name, price=100, category=category)
+            for name in ('Бургер', 'Картошка', 'Кола')
+        ]
+        cls.first_restaurant, cls.second_restaurant = [
+            Restaurant.objects.create(name=name, address=f'Москва, Арбат, {number}')
+            for number, name in enumerate(('Первый', 'Второй'), start=1)
+        ]
+        RestaurantMenuItem.objects.create(restaurant=cls.first_restaurant, product=cls.burger)
+        RestaurantMenuItem.objects.create(restaurant=cls.first_restaurant, product=cls.fries)
+        RestaurantMenuItem.objects.create(restaurant=cls.second_restaurant, product=cls.burger)
+        RestaurantMenuItem.objects.create(
+            restaurant=cls.second_restaurant, product=cls.cola, availability=False
+        )
+
+    def test_restaurants_selling_every_product(self):
+        index = build_availability_index()
+
+        self.assertEqual(
+            index.get_restaurant_ids([self.burger.id]),
+            [self.first_restaurant.id, self.second_restaurant.id],
+        )
+        self.assertEqual(
+            index.get_restaurant_ids([self.burger.id, self.fries.id]),
+            [self.first_restaurant.id],
+        )
+
+    def test_unavailable_menu_item_is_skipped(self):
+        index = build_availability_index()
+
+        self.assertEqual(index.get_restaurant_ids([self.cola.id]), [])
+        self.assertEqual(index.get_restaurant_ids([self.burger.id, self.cola.id]), [])
+
+    def test_unknown_product(self):
+        index = build_availability_index()
+
+        self.assertEqual(index.get_restaurant_ids([self.burger.id, 0]), [])
+
+    def test_empty_product_set(self):
+        index = AvailabilityIndex([3, 5], {})
+
+        self.assertEqual(index.get_restaurant_ids([]), [3, 5])
+
+    def test_index_is_rebuilt_after_reset(self):
+        reset_availability_index()
+        index = get_availability_index()
+        self.assertIs(get_availability_index(), index)
+
+        RestaurantMenuItem.objects.create(restaurant=self.second_restaurant, product=self.fries)
+        reset_availability_index()
+
+        rebuilt_index = get_availability_index()
+        self.assertIsNot(rebuilt_index, index)
+        self.assertEqual(
+            rebuilt_index.get_restaurant_ids([self.burger.id, self.fries.id]),
+            [self.first_restaurant.id, self.second_restaurant.id],
+        )
+
+
+class PlainOrderItemSerializer(ModelSerializer):
+    product = PrimaryKeyRelatedField(queryset=Product.objects.all())
+
+    class Meta:
+        model = OrderItem
+        fields = ['product', 'quantity']
+
+
+class OrderItemSerializerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.products = [
+            Product.objects.create(name=f'Бургер {number}', price=100 + number, category=category)
+            for number in range(3)
+        ]
+
+    def test_one_product_query_per_cart(self):
+        serializer = OrderSerializer(data={
+            'products': [
+                {'product': product.id, 'quantity': 2}
+                for product in self.products
+            ],
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'address': 'Москва, Тверская, 1',
+            'phonenumber': '+79991234567',
+        })
+
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        self.assertEqual(
+            [item['product'] for item in serializer.validated_data['products']],
+            self.products,
+        )
+
+    def test_errors_match_primary_key_related_field(self):
+        product_id = self.products[0].id
+        carts = {
+            'missing pk': [{'product': product_id, 'quantity': 1}, {'product': 9999, 'quantity': 1}],
+            'wrong type': [{'product': 'burger', 'quantity': 1}, {'product': [product_id], 'quantity': 1}],
+            'bool': [{'product': True, 'quantity': 1}],
+            'non-dict item': ['burger', {'product': product_id, 'quantity': 1}],
+            'no product': [{'quantity': 1}],
+            'string pk': [{'product': str(product_id), 'quantity': 1}],
+        }
+        for name, cart in carts.items():
+            with self.subTest(name):
+                serializer = OrderItemSerializer(data=cart, many=True)
+                plain_serializer = PlainOrderItemSerializer(data=cart, many=True)
+
+                self.assertEqual(serializer.is_valid(), plain_serializer.is_valid())
+                self.assertEqual(serializer.errors, plain_serializer.errors)
+
+
+@override_settings(ORDER_INTAKE_MODE='queued')
+class QueuedOrderIntakeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.burger = Product.objects.create(name='Бургер', price=100, category=category)
+        cls.fries = Product.objects.create(name='Картошка', price=50, category=category)
+
+    def register_order(self, *products):
+        order_data = {
+            'products': [{'product': product.id, 'quantity': 2} for product in products],
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'address': 'Москва, Тверская, 1',
+            'phonenumber': '+79991234567',
+        }
+        return self.client.post('/api/order/', json.dumps(order_data), content_type='application/json')
+
+    def get_status(self, token):
+        return self.client.get(f'/api/order/queued/{token}/')
+
+    def test_order_is_accepted(self):
+        response = self.register_order(self.burger)
+
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        self.assertEqual(body['status'], 'queued')
+        self.assertIsNone(body['order_id'])
+        self.assertEqual(body['error'], '')
+        self.assertEqual(QueuedOrder.objects.get().token.hex, body['token'].replace('-', ''))
+        self.assertFalse(Order.objects.exists())
+
+    def test_status_follows_processing(self):
+        token = self.register_order(self.burger, self.fries).json()['token']
+
+        response = self.get_status(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'queued')
+
+        self.assertEqual(process_queued_orders(10), 1)
+
+        body = self.get_status(token).json()
+        self.assertEqual(body['status'], 'created')
+        order = Order.objects.get()
+        self.assertEqual(body['order_id'], order.id)
+        self.assertEqual(order.total_price, 300)
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(order.registered_at, QueuedOrder.objects.get().queued_at)
+
+    def test_unknown_token(self):
+        response = self.get_status('00000000-0000-0000-0000-000000000000')
+        self.assertEqual(response.status_code, 404)
+
+    def test_batches(self):
+        for _ in range(3):
+            self.register_order(self.burger)
+
+        self.assertEqual(process_queued_orders(2), 2)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(QueuedOrder.objects.filter(status=QueuedOrder.QUEUED).count(), 1)
+
+        self.assertEqual(process_queued_orders(2), 1)
+        self.assertEqual(process_queued_orders(2), 0)
+        self.assertEqual(Order.objects.count(), 3)
+
+    def test_deleted_product_fails_order(self):
+        failed_token = self.register_order(self.burger, self.fries).json()['token']
+        created_token = self.register_order(self.burger).json()['token']
+        fries_id = self.fries.id
+        self.fries.delete()
+
+        self.assertEqual(process_queued_orders(10), 2)
+
+        body = self.get_status(failed_token).json()
+        self.assertEqual(body['status'], 'failed')
+        self.assertIsNone(body['order_id'])
+        self.assertIn(str(fries_id), body['error'])
+        self.assertEqual(self.get_status(created_token).json()['status'], 'created')
+        self.assertEqual(Order.objects.count(), 1)
@@ -1,6 +1,7 @@
 from django.urls import path
 
-from .views import product_list_api, banners_list_api, register_order
+from .views import product_list_api, banners_list_api, register_order, import_orders_api
+from .views import queued_order_status
 
 
 app_name = "foodcartapp"
@@ -9,4 +10,6 @@ urlpatterns = [
     path('products/', product_list_api),
     path('banners/', banners_list_api),
     path('order/', register_order),
+    path('order/queued/<uuid:token>/', queued_order_status),
+    path('orders/import/', import_orders_api),
 ]
@@ -0,0 +1,47 @@
+import time
+
+from django.core.cache import cache
+
+NANOSECONDS_IN_SECOND = 10 ** 9
+
+
+class VersionCounter:
+    # Lives in the shared cache, so a bump made by any process, including
+    # a management command, is seen by all the others. A version is the
+    # time of its bump in nanoseconds, so every process also agrees on when
+    # the data changed.
+    # With get_check_interval the last seen version is kept in memory and
+    # the shared cache is read at most once per that many seconds
+    def __init__(self, cache_key, get_check_interval=None):
+        self.cache_key = cache_key
+        self.get_check_interval = get_check_interval
+        self.last_seen = None
+
+    def get(self):
+        last_seen = self.last_seen
+        if last_seen is not None and self.get_check_interval is not None:
+            version, checked_at = last_seen
+            if time.monotonic() - checked_at < self.get_check_interval():
+                return version
+        return self.get_shared()
+
+    def get_shared(self):
+        version = cache.get(self.cache_key)
+        if version is None:
+            # Starting from the current time never repeats a version seen
+            # before the cache was flushed
+            cache.add(self.cache_key, time.time_ns(), None)
+            version = cache.get(self.cache_key)
+        self.last_seen = (version, time.monotonic())
+        return version
+
+    def bump(self):
+        # Every bump moves to the next second at least: Last-Modified has a
+        # one second resolution and must not repeat for changed data
+        version = max(time.time_ns(), self.get_shared() + NANOSECONDS_IN_SECOND)
+        cache.set(self.cache_key, version, None)
+        self.last_seen = (version, time.monotonic())
+
+
+def get_version_timestamp(version):
+    return version // NANOSECONDS_IN_SECOND
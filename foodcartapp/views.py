@@ -1,125 +1,201 @@
 from collections import OrderedDict
+from collections.abc import Iterator
+from urllib.parse import urlencode
 
-import phonenumbers
+from django.conf import settings
+from django.db import IntegrityError
 from django.db import transaction
-from django.http import JsonResponse
-from django.templatetags.static import static
-from phonenumbers import PhoneNumberFormat
-from phonenumbers import is_valid_number
-from phonenumbers.phonenumberutil import NumberParseException
+from django.shortcuts import get_object_or_404
 from rest_framework.decorators import api_view
+from rest_framework.decorators import parser_classes
+from rest_framework.decorators import permission_classes
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
-from rest_framework.serializers import CharField
-from rest_framework.serializers import ModelSerializer
 from rest_framework.serializers import ValidationError
 
-from .models import Order
-from .models import OrderItem
-from .models import Product
+from .banners import banners_store
+from .catalog import CatalogQuery
+from .catalog import catalog_store
+from .catalog import get_catalog_products
+from .idempotency import IDEMPOTENCY_KEY_MAX_LENGTH
+from .idempotency import get_queued_order_by_idempotency_key
+from .idempotency import get_request_fingerprint
+from .idempotency import get_stored_idempotency_key
+from .idempotency import release_expired_queued_orders_keys
+from .idempotency import store_idempotency_key
+from .models import QueuedOrder
+from .orders import create_orders
+from .orders import import_orders
+from .orders import queue_order
+from .parsers import NDJSONParser
+from .permissions import CanImportOrders
+from .renderers import FastJsonResponse
+from .serializers import OrderSerializer
+from .snapshots import get_snapshot_response
 
 
 def banners_list_api(request):
-    # FIXME move data to db?
-    return JsonResponse([
+    return get_snapshot_response(
+        request, banners_store.get_snapshot(), settings.BANNERS_CACHE_CONTROL
+    )
+
+
+def product_list_api(request):
+    if not request.GET.keys() & CatalogQuery.base_fields.keys():
+        return get_snapshot_response(
+            request, catalog_store.get_snapshot(), settings.CATALOG_CACHE_CONTROL
+        )
+
+    catalog_query = CatalogQuery(request.GET)
+    if not catalog_query.is_valid():
+        errors = {
+            field: list(field_errors)
+            for field, field_errors in catalog_query.errors.items()
+        }
+        return FastJsonResponse(errors, status=400)
+
+    query = catalog_query.cleaned_data
+    limit = query['limit']
+    if limit is None and catalog_query.is_paginated():
+        limit = settings.CATALOG_PAGE_SIZE
+    products, next_cursor = get_catalog_products(
+        category_id=query['category'],
+        fields=query['fields'],
+        cursor=query['cursor'],
+        limit=limit,
+    )
+
+    if catalog_query.is_paginated():
+        next_page = None
+        if next_cursor is not None:
+            next_page_query = request.GET.copy()
+            next_page_query['cursor'] = next_cursor
+            next_page_query['limit'] = limit
+            next_page = f'{request.path}?{urlencode(sorted(next_page_query.items()))}'
+        response = FastJsonResponse({'results': products, 'next': next_page})
+    else:
+        response = FastJsonResponse(products)
+    response['Cache-Control'] = settings.CATALOG_CACHE_CONTROL
+    return response
+
+
+def get_replayed_order_response(stored_key, request_fingerprint):
+    if stored_key.request_fingerprint != request_fingerprint:
+        return Response(
+            {'detail': 'Ключ идемпотентности уже использован для другого заказа'},
+            status=422,
+        )
+    return Response(
+        stored_key.response_body,
+        headers={'Idempotent-Replayed': 'true'},
+    )
+
+
+def get_queued_order_response(queued_order, status=202, headers=None):
+    return Response(
         {
-            'title': 'Burger',
-            'src': static('burger.jpg'),
-            'text': 'Tasty Burger at your door step',
+            'token': queued_order.token,
+            'status': queued_order.status,
+            'order_id': queued_order.order_id,
+            'error': queued_order.error,
         },
+        status=status,
+        headers=headers,
+    )
+
+
+def get_replayed_queued_order_response(queued_order, request_fingerprint):
+    if queued_order.request_fingerprint != request_fingerprint:
+        return Response(
+            {'detail': 'Ключ идемпотентности уже использован для другого заказа'},
+            status=422,
+        )
+    # The same response as when the order was queued, the current status is
+    # served by queued_order_status
+    return Response(
         {
-            'title': 'Spices',
-            'src': static('food.jpg'),
-            'text': 'All Cuisines',
+            'token': queued_order.token,
+            'status': QueuedOrder.QUEUED,
+            'order_id': None,
+            'error': '',
         },
-        {
-            'title': 'New York',
-            'src': static('tasty.jpg'),
-            'text': 'Food is incomplete without a tasty dessert',
-        }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+        status=202,
+        headers={'Idempotent-Replayed': 'true'},
+    )
 
 
-def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            },
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+def register_queued_order(validated_order, idempotency_key, request_fingerprint):
+    try:
+        with transaction.atomic():
+            if idempotency_key is not None:
+                release_expired_queued_orders_keys(idempotency_key)
+            queued_order = queue_order(validated_order, idempotency_key, request_fingerprint)
+    except IntegrityError:
+        queued_order = idempotency_key and get_queued_order_by_idempotency_key(idempotency_key)
+        if not queued_order:
+            raise
+        return get_replayed_queued_order_response(queued_order, request_fingerprint)
+    return get_queued_order_response(queued_order)
 
 
 @api_view(['POST'])
-@transaction.atomic
 def register_order(request):
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key is not None:
+        if not idempotency_key or len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise ValidationError({
+                'Idempotency-Key': f'Ключ должен быть от 1 до {IDEMPOTENCY_KEY_MAX_LENGTH} символов'
+            })
+        request_fingerprint = get_request_fingerprint(request.data)
+        stored_key = get_stored_idempotency_key(idempotency_key)
+        if stored_key:
+            return get_replayed_order_response(stored_key, request_fingerprint)
+        queued_order = get_queued_order_by_idempotency_key(idempotency_key)
+        if queued_order:
+            return get_replayed_queued_order_response(queued_order, request_fingerprint)
+
     serializer = OrderSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
-
-    recorded_order = Order.objects.create(
-        address=serializer.validated_data['address'],
-        firstname=serializer.validated_data['firstname'],
-        lastname=serializer.validated_data['lastname'],
-        phonenumber=serializer.validated_data['phonenumber']
-    )
-    products = serializer.validated_data['products']
-
-    OrderItem.objects.bulk_create([
-        OrderItem(
-            order=recorded_order,
-            product=product['product'],
-            quantity=product['quantity'],
-            total_price=product['product'].price * product['quantity']
+    if settings.ORDER_INTAKE_MODE == 'queued':
+        return register_queued_order(
+            serializer.validated_data, idempotency_key,
+            request_fingerprint if idempotency_key is not None else '',
         )
-        for product in products
-    ])
 
+    try:
+        with transaction.atomic():
+            recorded_order, = create_orders([serializer.validated_data])
+            if idempotency_key is not None:
+                store_idempotency_key(
+                    idempotency_key, request_fingerprint, recorded_order, serializer.data
+                )
+    except IntegrityError:
+        # Lost the race to a concurrent request with the same key
+        stored_key = idempotency_key and get_stored_idempotency_key(idempotency_key)
+        if not stored_key:
+            raise
+        return get_replayed_order_response(stored_key, request_fingerprint)
     return Response(serializer.data)
 
 
-class OrderItemSerializer(ModelSerializer):
-    class Meta:
-        model = OrderItem
-        fields = ['product', 'quantity']
-
-
-class OrderSerializer(ModelSerializer):
-    products = OrderItemSerializer(many=True, allow_empty=False, write_only=True)
-    phonenumber = CharField()
+@api_view(['GET'])
+def queued_order_status(request, token):
+    queued_order = get_object_or_404(QueuedOrder, token=token)
+    return get_queued_order_response(queued_order, status=200)
 
-    class Meta:
-        model = Order
-        fields = ['products', 'firstname', 'lastname', 'address', 'phonenumber']
 
-    def validate_phonenumber(self, value):
-        try:
-            parsed_phone = phonenumbers.parse(value, 'RU')
-        except NumberParseException:
-            raise ValidationError('Некорректный номер телефона')
-
-        if not is_valid_number(parsed_phone):
-            raise ValidationError('Некорректный номер телефона')
-        standardized_phone = phonenumbers.format_number(
-            parsed_phone, PhoneNumberFormat.E164
-        )
-        return standardized_phone
+@api_view(['POST'])
+@parser_classes([JSONParser, NDJSONParser])
+@permission_classes([CanImportOrders])
+def import_orders_api(request):
+    records = request.data
+    if not isinstance(records, (list, Iterator)):
+        raise ValidationError('Ожидался массив заказов или заказы в формате NDJSON')
+
+    results = list(import_orders(records, settings.ORDERS_IMPORT_CHUNK_SIZE))
+    failed_count = sum('errors' in result for result in results)
+    return Response({
+        'imported': len(results) - failed_count,
+        'failed': failed_count,
+        'results': results,
+    })
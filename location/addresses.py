@@ -0,0 +1,35 @@
+import re
+
+ABBREVIATIONS = {
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'пр-кт': 'проспект',
+    'просп': 'проспект',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'наб': 'набережная',
+    'ш': 'шоссе',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'мкр': 'микрорайон',
+    'мкр-н': 'микрорайон',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+}
+# Words that only mark the next token and are often omitted:
+# "г. Москва, д. 1" is the same address as "Москва, 1"
+OMITTED_WORDS = {'г', 'город', 'д', 'дом'}
+
+WORD_PATTERN = re.compile(r'[\w/-]+')
+
+
+def normalize_address(address):
+    address = address.casefold().replace('ё', 'е')
+    words = []
+    for word in WORD_PATTERN.findall(address):
+        word = word.strip('-/')
+        word = ABBREVIATIONS.get(word, word)
+        if word and word not in OMITTED_WORDS:
+            words.append(word)
+    return ' '.join(words)
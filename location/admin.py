@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from location.models import DeliveryLocation
+from location.models import GeocoderTask
 from location.models import RestaurantLocation
 
 
@@ -12,3 +13,10 @@ class DeliveryLocation(admin.ModelAdmin):
 @admin.register(RestaurantLocation)
 class DeliveryLocation(admin.ModelAdmin):
     list_display = ['address', 'lon', 'lat']
+
+
+@admin.register(GeocoderTask)
+class GeocoderTaskAdmin(admin.ModelAdmin):
+    list_display = ['address', 'kind', 'attempts', 'next_attempt_at', 'last_error']
+    list_filter = ['kind']
+    search_fields = ['address']
@@ -0,0 +1,44 @@
+import numpy as np
+from geopy import distance
+
+WGS84_SEMI_MAJOR_AXIS_KM = 6378.137
+WGS84_ECCENTRICITY_SQUARED = 0.00669437999014
+
+
+def get_geodesic_distance_matrix(origins, destinations):
+    return np.array(
+        [
+            [distance.distance(origin, destination).km for destination in destinations]
+            for origin in origins
+        ],
+        dtype=float
+    ).reshape(len(origins), len(destinations))
+
+
+def get_distance_matrix(origins, destinations, precise=False):
+    if precise:
+        return get_geodesic_distance_matrix(origins, destinations)
+
+    # Equirectangular projection scaled by the WGS84 radii of curvature at
+    # the mean latitude: within a city it is off the geodesic by under a metre
+    origins = np.radians(np.asarray(origins, dtype=float).reshape(-1, 2))
+    destinations = np.radians(np.asarray(destinations, dtype=float).reshape(-1, 2))
+
+    origin_lats = origins[:, 0, np.newaxis]
+    origin_lons = origins[:, 1, np.newaxis]
+    destination_lats = destinations[np.newaxis, :, 0]
+    destination_lons = destinations[np.newaxis, :, 1]
+
+    mean_lats = (origin_lats + destination_lats) / 2
+    curvature_factors = 1 - WGS84_ECCENTRICITY_SQUARED * np.sin(mean_lats) ** 2
+    meridian_radii = (
+        WGS84_SEMI_MAJOR_AXIS_KM * (1 - WGS84_ECCENTRICITY_SQUARED)
+        / curvature_factors ** 1.5
+    )
+    parallel_radii = WGS84_SEMI_MAJOR_AXIS_KM / np.sqrt(curvature_factors)
+
+    lon_deltas = (destination_lons - origin_lons + np.pi) % (2 * np.pi) - np.pi
+    return np.hypot(
+        meridian_radii * (destination_lats - origin_lats),
+        parallel_radii * np.cos(mean_lats) * lon_deltas,
+    )
@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+
+class FakeGeocoderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections_count += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests_count += 1
+            failing = self.server.failures_left > 0
+            if failing:
+                self.server.failures_left -= 1
+        time.sleep(self.server.delay)
+
+        if failing:
+            self.send_json({'error': 'unavailable'}, status=503)
+            return
+        place = parse_qs(urlparse(self.path).query).get('geocode', [''])[0]
+        coordinates = self.server.places.get(place)
+        found_places = []
+        if coordinates:
+            lon, lat = coordinates
+            found_places.append({'GeoObject': {'Point': {'pos': f'{lon} {lat}'}}})
+        self.send_json(
+            {'response': {'GeoObjectCollection': {'featureMember': found_places}}}
+        )
+
+    def send_json(self, payload, status=200):
+        content = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeGeocoder:
+    # Local stand-in for the Yandex geocoder API: answers with the
+    # coordinates from `places`, can be slowed down with `delay` and made
+    # to answer 503 to the next `failures_left` requests
+    def __init__(self, places=None, delay=0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGeocoderHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.places = places or {}
+        self.server.delay = delay
+        self.server.failures_left = 0
+        self.server.requests_count = 0
+        self.server.connections_count = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}/1.x'
+
+    @property
+    def requests_count(self):
+        return self.server.requests_count
+
+    @property
+    def connections_count(self):
+        return self.server.connections_count
+
+    def fail_next_requests(self, count):
+        with self.server.lock:
+            self.server.failures_left = count
+
+    def set_delay(self, delay):
+        self.server.delay = delay
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,142 @@
+from collections import defaultdict
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+
+from location.addresses import normalize_address
+from location.models import DeliveryLocation
+from location.models import GeocoderTask
+from location.models import RestaurantLocation
+from location.models import get_location_expiration_dates
+from location.yandex_geocoder import GeocoderUnavailable
+from location.yandex_geocoder import fetch_coordinates_many
+
+LOCATION_MODELS = {
+    GeocoderTask.DELIVERY: DeliveryLocation,
+    GeocoderTask.RESTAURANT: RestaurantLocation,
+}
+
+
+def get_stored_coordinates(addresses, kind):
+    # Expired entries are still returned, but queued to be refreshed by the
+    # geocoding worker: addresses not found expire sooner than found ones
+    found_expiration_date, not_found_expiration_date = get_location_expiration_dates()
+    addresses_by_normalized_address = defaultdict(list)
+    for address in set(addresses):
+        addresses_by_normalized_address[normalize_address(address)].append(address)
+    locations = LOCATION_MODELS[kind].objects.filter(
+        normalized_address__in=addresses_by_normalized_address
+    )
+
+    stored_coordinates = {}
+    expired_addresses = []
+    for location in locations:
+        coordinates = {'lon': location.lon, 'lat': location.lat}
+        for address in addresses_by_normalized_address[location.normalized_address]:
+            stored_coordinates[address] = coordinates
+        if location.lon is None:
+            expiration_date = not_found_expiration_date
+        else:
+            expiration_date = found_expiration_date
+        if location.registered_at < expiration_date:
+            expired_addresses.append(location.address)
+    enqueue_addresses(expired_addresses, kind)
+    return stored_coordinates
+
+
+def enqueue_addresses(addresses, kind):
+    addresses = {normalize_address(address): address for address in addresses}
+    GeocoderTask.objects.bulk_create(
+        [
+            GeocoderTask(address=address, normalized_address=normalized_address, kind=kind)
+            for normalized_address, address in addresses.items() if normalized_address
+        ],
+        ignore_conflicts=True
+    )
+
+
+def enqueue_missing_addresses(addresses, kind):
+    addresses = {normalize_address(address): address for address in addresses}
+    if not addresses:
+        return
+    stored_addresses = set(
+        LOCATION_MODELS[kind].objects
+        .filter(normalized_address__in=addresses)
+        .values_list('normalized_address', flat=True)
+    )
+    enqueue_addresses(
+        [
+            address for normalized_address, address in addresses.items()
+            if normalized_address not in stored_addresses
+        ],
+        kind
+    )
+
+
+def enqueue_address(address, kind):
+    enqueue_missing_addresses([address], kind)
+
+
+def enqueue_restaurant_address(address):
+    enqueue_address(address, GeocoderTask.RESTAURANT)
+
+
+def postpone_task(task, error):
+    task.attempts += 1
+    if task.attempts >= settings.GEOCODER_MAX_ATTEMPTS:
+        give_up_task(task)
+        return
+    task.last_error = str(error)
+    retry_delay = settings.GEOCODER_RETRY_DELAY * 2 ** (task.attempts - 1)
+    task.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay)
+    task.save(update_fields=['attempts', 'last_error', 'next_attempt_at'])
+
+
+def give_up_task(task):
+    # A task left in the queue would block the address from being queued
+    # again. Stored as not found, it is retried after GEOCODER_NOT_FOUND_TTL.
+    # Known coordinates are kept, but registered anew, so they are retried
+    # after GEOCODER_CACHE_TTL instead of on the next page load
+    LOCATION_MODELS[task.kind].objects.update_or_create(
+        normalized_address=task.normalized_address,
+        defaults={'address': task.address, 'registered_at': timezone.now()},
+    )
+    task.delete()
+
+
+def process_geocoder_tasks(batch_size):
+    tasks = list(
+        GeocoderTask.objects
+        .filter(next_attempt_at__lte=timezone.now())
+        .order_by('next_attempt_at')[:batch_size]
+    )
+    found_coordinates = fetch_coordinates_many(
+        settings.YANDEX_GEOCODER_API, [task.address for task in tasks]
+    )
+
+    processed_tasks = 0
+    for task in tasks:
+        coordinates = found_coordinates[task.address]
+        if isinstance(coordinates, GeocoderUnavailable):
+            continue
+        processed_tasks += 1
+        if isinstance(coordinates, requests.RequestException):
+            postpone_task(task, coordinates)
+            continue
+
+        # An address without matches is stored with empty coordinates
+        # so that it is not queued again on every page load
+        coordinates = coordinates or {'lon': None, 'lat': None}
+        LOCATION_MODELS[task.kind].objects.update_or_create(
+            normalized_address=task.normalized_address,
+            defaults={
+                'address': task.address,
+                'lon': coordinates['lon'],
+                'lat': coordinates['lat'],
+                'registered_at': timezone.now(),
+            }
+        )
+        task.delete()
+    return processed_tasks
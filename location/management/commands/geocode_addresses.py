@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from location.geocoding import process_geocoder_tasks
+
+
+class Command(BaseCommand):
+    help = 'Получает координаты адресов из очереди геокодирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=50,
+            help='сколько адресов обрабатывать за один проход'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=5,
+            help='пауза в секундах, если очередь пуста'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='обработать очередь один раз и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed_tasks = process_geocoder_tasks(options['batch_size'])
+            if processed_tasks:
+                self.stdout.write(f'Обработано адресов: {processed_tasks}')
+            if options['once'] and processed_tasks < options['batch_size']:
+                return
+            if not processed_tasks:
+                time.sleep(options['sleep'])
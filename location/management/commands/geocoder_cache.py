@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from location.geocoding import LOCATION_MODELS
+from location.geocoding import enqueue_addresses
+
+
+class Command(BaseCommand):
+    help = 'Удаляет или обновляет сохранённые координаты адресов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action', choices=['purge', 'refresh'],
+            help='purge — удалить записи, refresh — поставить адреса в очередь геокодирования'
+        )
+        parser.add_argument(
+            '--older-than', type=int,
+            help='обработать записи старше стольких дней, по умолчанию только устаревшие'
+        )
+        parser.add_argument(
+            '--not-found', action='store_true',
+            help='обработать только адреса, которые геокодер не нашёл'
+        )
+        parser.add_argument(
+            '--kind', choices=LOCATION_MODELS.keys(),
+            help='обработать только адреса доставки или только адреса ресторанов'
+        )
+
+    def handle(self, *args, **options):
+        kinds = [options['kind']] if options['kind'] else LOCATION_MODELS.keys()
+        for kind in kinds:
+            locations = LOCATION_MODELS[kind].objects.all()
+            if options['older_than'] is None:
+                locations = locations.expired()
+            else:
+                locations = locations.filter(
+                    registered_at__lt=timezone.now() - timedelta(days=options['older_than'])
+                )
+            if options['not_found']:
+                locations = locations.not_found()
+
+            if options['action'] == 'purge':
+                deleted_count, _ = locations.delete()
+                self.stdout.write(f'{kind}: удалено записей: {deleted_count}')
+            else:
+                addresses = list(locations.values_list('address', flat=True))
+                enqueue_addresses(addresses, kind)
+                self.stdout.write(f'{kind}: поставлено в очередь адресов: {len(addresses)}')
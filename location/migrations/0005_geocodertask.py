@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 19:27
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0004_restaurantlocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocoderTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=200, verbose_name='адрес')),
+                ('kind', models.CharField(choices=[('delivery', 'адрес доставки'), ('restaurant', 'адрес ресторана')], max_length=10, verbose_name='тип адреса')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='число попыток')),
+                ('last_error', models.TextField(blank=True, verbose_name='последняя ошибка')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='дата постановки в очередь')),
+                ('next_attempt_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='время следующей попытки')),
+            ],
+            options={
+                'verbose_name': 'задача геокодирования',
+                'verbose_name_plural': 'задачи геокодирования',
+                'unique_together': {('address', 'kind')},
+            },
+        ),
+    ]
@@ -0,0 +1,83 @@
+from django.db import migrations, models
+
+from location.addresses import normalize_address
+
+
+def merge_locations(location_model):
+    # The freshest found coordinates win, duplicates of the address are removed
+    kept_locations = {}
+    for location in location_model.objects.order_by('-registered_at', '-id'):
+        normalized_address = normalize_address(location.address)
+        kept_location = kept_locations.get(normalized_address)
+        if kept_location is None:
+            kept_locations[normalized_address] = location
+        elif kept_location.lon is None and location.lon is not None:
+            kept_location.delete()
+            kept_locations[normalized_address] = location
+        else:
+            location.delete()
+
+    for normalized_address, location in kept_locations.items():
+        location.normalized_address = normalized_address
+        location.save(update_fields=['normalized_address'])
+
+
+def merge_duplicate_addresses(apps, schema_editor):
+    merge_locations(apps.get_model('location', 'DeliveryLocation'))
+    merge_locations(apps.get_model('location', 'RestaurantLocation'))
+
+    GeocoderTask = apps.get_model('location', 'GeocoderTask')
+    kept_tasks = set()
+    for task in GeocoderTask.objects.order_by('created_at', 'id'):
+        normalized_address = normalize_address(task.address)
+        if (normalized_address, task.kind) in kept_tasks:
+            task.delete()
+            continue
+        kept_tasks.add((normalized_address, task.kind))
+        task.normalized_address = normalized_address
+        task.save(update_fields=['normalized_address'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0005_geocodertask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverylocation',
+            name='normalized_address',
+            field=models.CharField(max_length=200, null=True, verbose_name='нормализованный адрес'),
+        ),
+        migrations.AddField(
+            model_name='restaurantlocation',
+            name='normalized_address',
+            field=models.CharField(max_length=200, null=True, verbose_name='нормализованный адрес'),
+        ),
+        migrations.AddField(
+            model_name='geocodertask',
+            name='normalized_address',
+            field=models.CharField(max_length=200, null=True, verbose_name='нормализованный адрес'),
+        ),
+        migrations.RunPython(merge_duplicate_addresses, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='deliverylocation',
+            name='normalized_address',
+            field=models.CharField(max_length=200, unique=True, verbose_name='нормализованный адрес'),
+        ),
+        migrations.AlterField(
+            model_name='restaurantlocation',
+            name='normalized_address',
+            field=models.CharField(max_length=200, unique=True, verbose_name='нормализованный адрес'),
+        ),
+        migrations.AlterField(
+            model_name='geocodertask',
+            name='normalized_address',
+            field=models.CharField(max_length=200, verbose_name='нормализованный адрес'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='geocodertask',
+            unique_together={('normalized_address', 'kind')},
+        ),
+    ]
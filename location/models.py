@@ -1,6 +1,32 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 
+from location.addresses import normalize_address
+
+
+def get_location_expiration_dates():
+    now = timezone.now()
+    return (
+        now - timedelta(days=settings.GEOCODER_CACHE_TTL),
+        now - timedelta(days=settings.GEOCODER_NOT_FOUND_TTL),
+    )
+
+
+class LocationQuerySet(models.QuerySet):
+    def not_found(self):
+        return self.filter(lon__isnull=True)
+
+    def expired(self):
+        found_expiration_date, not_found_expiration_date = get_location_expiration_dates()
+        return self.filter(
+            Q(lon__isnull=False, registered_at__lt=found_expiration_date)
+            | Q(lon__isnull=True, registered_at__lt=not_found_expiration_date)
+        )
+
 
 class DeliveryLocation(models.Model):
     address = models.CharField(
@@ -8,6 +34,11 @@ class DeliveryLocation(models.Model):
         max_length=200,
         unique=True
     )
+    normalized_address = models.CharField(
+        verbose_name='нормализованный адрес',
+        max_length=200,
+        unique=True
+    )
     lon = models.FloatField('долгота', blank=True, null=True)
     lat = models.FloatField('широта', blank=True, null=True)
     registered_at = models.DateTimeField(
@@ -16,6 +47,12 @@ class DeliveryLocation(models.Model):
         db_index=True
     )
 
+    objects = LocationQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        self.normalized_address = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
 
 class RestaurantLocation(models.Model):
     address = models.CharField(
@@ -23,6 +60,11 @@ class RestaurantLocation(models.Model):
         max_length=200,
         unique=True
     )
+    normalized_address = models.CharField(
+        verbose_name='нормализованный адрес',
+        max_length=200,
+        unique=True
+    )
     lon = models.FloatField('долгота', blank=True, null=True)
     lat = models.FloatField('широта', blank=True, null=True)
     registered_at = models.DateTimeField(
@@ -30,3 +72,63 @@ class RestaurantLocation(models.Model):
         verbose_name='дата запроса к геокодеру',
         db_index=True
     )
+
+    objects = LocationQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        self.normalized_address = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
+
+class GeocoderTask(models.Model):
+    DELIVERY = 'delivery'
+    RESTAURANT = 'restaurant'
+    KINDS = [
+        (DELIVERY, 'адрес доставки'),
+        (RESTAURANT, 'адрес ресторана'),
+    ]
+
+    address = models.CharField(
+        verbose_name='адрес',
+        max_length=200
+    )
+    normalized_address = models.CharField(
+        verbose_name='нормализованный адрес',
+        max_length=200
+    )
+    kind = models.CharField(
+        'тип адреса',
+        max_length=10,
+        choices=KINDS
+    )
+    attempts = models.PositiveSmallIntegerField(
+        'число попыток',
+        default=0
+    )
+    last_error = models.TextField(
+        'последняя ошибка',
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='дата постановки в очередь'
+    )
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='время следующей попытки',
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'задача геокодирования'
+        verbose_name_plural = 'задачи геокодирования'
+        unique_together = [
+            ['normalized_address', 'kind']
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: {self.address}'
+
+    def save(self, *args, **kwargs):
+        self.normalized_address = normalize_address(self.address)
+        super().save(*args, **kwargs)
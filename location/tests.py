@@ -1,3 +1,234 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
 from django.test import TestCase
+from django.test import override_settings
+from django.utils import timezone
+
+from location.addresses import normalize_address
+from location.distances import get_distance_matrix
+from location.fake_geocoder import FakeGeocoder
+from location.geocoding import enqueue_addresses
+from location.geocoding import get_stored_coordinates
+from location.geocoding import process_geocoder_tasks
+from location.models import DeliveryLocation
+from location.models import GeocoderTask
+from location.yandex_geocoder import GeocoderClient
+from location.yandex_geocoder import GeocoderUnavailable
+
+
+class DistanceMatrixTest(SimpleTestCase):
+    orders = [
+        (55.751244, 37.618423),
+        (55.796127, 37.534850),
+        (55.658810, 37.845200),
+        (55.911360, 37.734510),
+    ]
+    restaurants = [
+        (55.761620, 37.609000),
+        (55.684750, 37.338010),
+        (55.579320, 37.681160),
+    ]
+
+    def test_fast_matrix_agrees_with_geodesic(self):
+        fast_distances = get_distance_matrix(self.orders, self.restaurants)
+        precise_distances = get_distance_matrix(self.orders, self.restaurants, precise=True)
+
+        self.assertEqual(fast_distances.shape, (4, 3))
+        self.assertEqual(precise_distances.shape, (4, 3))
+        for fast_row, precise_row in zip(fast_distances, precise_distances):
+            for fast_distance, precise_distance in zip(fast_row, precise_row):
+                self.assertAlmostEqual(fast_distance, precise_distance, delta=0.01)
+
+    def test_empty_matrix(self):
+        self.assertEqual(get_distance_matrix([], self.restaurants).shape, (0, 3))
+        self.assertEqual(get_distance_matrix(self.orders, []).shape, (4, 0))
+        self.assertEqual(get_distance_matrix([], [], precise=True).shape, (0, 0))
+
+
+class NormalizeAddressTest(SimpleTestCase):
+    def test_variants_share_normalized_address(self):
+        variants = [
+            'Москва, Тверская 1',
+            'москва тверская, д.1 ',
+            'г. Москва,  Тверская,   дом 1',
+            'МОСКВА ТВЕРСКАЯ 1.',
+        ]
+        self.assertEqual(
+            {normalize_address(variant) for variant in variants},
+            {'москва тверская 1'}
+        )
+
+    def test_abbreviations_are_expanded(self):
+        self.assertEqual(
+            normalize_address('Москва, ул. Арбат, д. 10, корп. 2'),
+            normalize_address('москва улица арбат 10 корпус 2')
+        )
+        self.assertEqual(
+            normalize_address('Москва, Ленинский пр-т, 5'),
+            'москва ленинский проспект 5'
+        )
+        self.assertEqual(
+            normalize_address('Москва, Ленинский просп. 5'),
+            'москва ленинский проспект 5'
+        )
+
+    def test_different_streets_stay_different(self):
+        self.assertNotEqual(
+            normalize_address('Москва, улица Ленина 5'),
+            normalize_address('Москва, проспект Ленина 5')
+        )
+        self.assertEqual(normalize_address('Москва, Новая 12/1'), 'москва новая 12/1')
+        self.assertEqual(normalize_address('Ёлкино, ул. Берёзовая'), 'елкино улица березовая')
+
+
+class GeocoderClientTest(SimpleTestCase):
+    places = {
+        'Москва, Тверская 1': ('37.611347', '55.757718'),
+    }
+
+    def setUp(self):
+        self.geocoder = FakeGeocoder(self.places).__enter__()
+        self.addCleanup(self.geocoder.__exit__)
+
+    def get_client(self, **kwargs):
+        client_kwargs = {
+            'base_url': self.geocoder.url,
+            'read_timeout': 1,
+            'backoff_factor': 0,
+            **kwargs,
+        }
+        return GeocoderClient(**client_kwargs)
+
+    def test_fetch_coordinates(self):
+        client = self.get_client()
+        self.assertEqual(
+            client.fetch_coordinates('key', 'Москва, Тверская 1'),
+            {'lon': '37.611347', 'lat': '55.757718'}
+        )
+        self.assertIsNone(client.fetch_coordinates('key', 'Нигде'))
+
+    def test_connections_are_reused(self):
+        client = self.get_client()
+        for _ in range(5):
+            client.fetch_coordinates('key', 'Москва, Тверская 1')
+        self.assertEqual(self.geocoder.requests_count, 5)
+        self.assertEqual(self.geocoder.connections_count, 1)
+
+    def test_server_errors_are_retried(self):
+        client = self.get_client(retries=2)
+        self.geocoder.fail_next_requests(2)
+        self.assertEqual(
+            client.fetch_coordinates('key', 'Москва, Тверская 1'),
+            {'lon': '37.611347', 'lat': '55.757718'}
+        )
+        self.assertEqual(self.geocoder.requests_count, 3)
+
+    def test_slow_server_times_out(self):
+        client = self.get_client(retries=0, read_timeout=0.2)
+        self.geocoder.set_delay(1)
+        started_at = time.monotonic()
+        with self.assertRaises(requests.Timeout):
+            client.fetch_coordinates('key', 'Москва, Тверская 1')
+        self.assertLess(time.monotonic() - started_at, 0.9)
+
+    def test_circuit_breaker_stops_requests(self):
+        client = self.get_client(retries=0, failure_threshold=2, reset_timeout=60)
+        self.geocoder.fail_next_requests(10)
+        for _ in range(2):
+            with self.assertRaises(requests.HTTPError):
+                client.fetch_coordinates('key', 'Москва, Тверская 1')
+        with self.assertRaises(GeocoderUnavailable):
+            client.fetch_coordinates('key', 'Москва, Тверская 1')
+        self.assertEqual(self.geocoder.requests_count, 2)
+
+    def test_circuit_breaker_lets_trial_request_through(self):
+        client = self.get_client(retries=0, failure_threshold=1, reset_timeout=0.1)
+        self.geocoder.fail_next_requests(1)
+        with self.assertRaises(requests.HTTPError):
+            client.fetch_coordinates('key', 'Москва, Тверская 1')
+        with self.assertRaises(GeocoderUnavailable):
+            client.fetch_coordinates('key', 'Москва, Тверская 1')
+        time.sleep(0.1)
+        self.assertEqual(
+            client.fetch_coordinates('key', 'Москва, Тверская 1'),
+            {'lon': '37.611347', 'lat': '55.757718'}
+        )
+
+    def test_fetch_coordinates_many(self):
+        client = self.get_client()
+        self.assertEqual(
+            client.fetch_coordinates_many(
+                'key', ['Москва, Тверская 1', 'Нигде', 'Москва, Тверская 1']
+            ),
+            {
+                'Москва, Тверская 1': {'lon': '37.611347', 'lat': '55.757718'},
+                'Нигде': None,
+            }
+        )
+        self.assertEqual(self.geocoder.requests_count, 2)
+
+    def test_fetch_coordinates_many_is_concurrent(self):
+        client = self.get_client(pool_size=10)
+        self.geocoder.set_delay(0.2)
+        places = [f'Москва, улица {number}' for number in range(10)]
+        started_at = time.monotonic()
+        found_coordinates = client.fetch_coordinates_many('key', places, max_workers=10)
+        self.assertLess(time.monotonic() - started_at, 1)
+        self.assertEqual(found_coordinates, dict.fromkeys(places))
+
+    def test_fetch_coordinates_many_returns_errors(self):
+        client = self.get_client(retries=0)
+        self.geocoder.fail_next_requests(1)
+        found_coordinates = client.fetch_coordinates_many('key', ['Нигде'])
+        self.assertIsInstance(found_coordinates['Нигде'], requests.HTTPError)
+
+
+@override_settings(GEOCODER_MAX_ATTEMPTS=2, GEOCODER_RETRY_DELAY=0)
+class ProcessGeocoderTasksTest(TestCase):
+    address = 'Москва, Тверская 1'
+
+    def process_failing_tasks(self):
+        error = requests.ConnectionError('timeout')
+        with mock.patch(
+            'location.geocoding.fetch_coordinates_many',
+            return_value={self.address: error},
+        ):
+            return process_geocoder_tasks(10)
+
+    def test_failed_task_is_postponed(self):
+        enqueue_addresses([self.address], GeocoderTask.DELIVERY)
+        self.assertEqual(self.process_failing_tasks(), 1)
+
+        task = GeocoderTask.objects.get()
+        self.assertEqual(task.attempts, 1)
+        self.assertFalse(DeliveryLocation.objects.exists())
+
+    def test_exhausted_task_is_stored_as_not_found(self):
+        enqueue_addresses([self.address], GeocoderTask.DELIVERY)
+        self.process_failing_tasks()
+        self.process_failing_tasks()
+
+        self.assertFalse(GeocoderTask.objects.exists())
+        location = DeliveryLocation.objects.get()
+        self.assertIsNone(location.lon)
+
+    def test_exhausted_task_keeps_known_coordinates(self):
+        DeliveryLocation.objects.create(
+            address=self.address, lon=37.6, lat=55.7,
+            registered_at=timezone.now() - timedelta(days=365),
+        )
+        enqueue_addresses([self.address], GeocoderTask.DELIVERY)
+        self.process_failing_tasks()
+        self.process_failing_tasks()
+
+        self.assertFalse(GeocoderTask.objects.exists())
+        location = DeliveryLocation.objects.get()
+        self.assertEqual(location.lon, 37.6)
+        self.assertGreater(location.registered_at, timezone.now() - timedelta(minutes=1))
 
-# Create your tests here.
+        get_stored_coordinates([self.address], GeocoderTask.DELIVERY)
+        self.assertFalse(GeocoderTask.objects.exists())
@@ -1,14 +1,140 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+YANDEX_GEOCODER_URL = 'https://geocode-maps.yandex.ru/1.x'
+
+
+class GeocoderUnavailable(requests.RequestException):
+    pass
+
+
+class CircuitBreaker:
+    # After `failure_threshold` failures in a row requests are rejected
+    # without touching the network for `reset_timeout` seconds, then one
+    # trial request is let through
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def before_request(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise GeocoderUnavailable('Геокодер недоступен, запросы временно не отправляются')
+            self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class GeocoderClient:
+    def __init__(self, base_url=YANDEX_GEOCODER_URL, connect_timeout=3.05,
+                 read_timeout=10, retries=3, backoff_factor=0.5,
+                 failure_threshold=5, reset_timeout=30, pool_size=10):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.circuit_breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        # A read timeout is not retried: the upstream is already hanging and
+        # retrying would multiply the time a worker waits for it
+        retry = Retry(
+            total=retries,
+            read=False,
+            backoff_factor=backoff_factor,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET'],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def fetch_coordinates(self, apikey, place):
+        self.circuit_breaker.before_request()
+        params = {'geocode': place, 'apikey': apikey, 'format': 'json'}
+        try:
+            response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            self.circuit_breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        response.raise_for_status()
+
+        found_places = response.json()['response']['GeoObjectCollection']['featureMember']
+        if not found_places:
+            return
+        most_relevant = found_places[0]
+        lon, lat = most_relevant['GeoObject']['Point']['pos'].split(' ')
+        return {'lon': lon, 'lat': lat}
+
+    def fetch_coordinates_many(self, apikey, places, max_workers=10):
+        # Failed lookups are returned as the raised exception instead of
+        # coordinates so that one bad address does not hide the others
+        places = list(dict.fromkeys(places))
+        if not places:
+            return {}
+
+        def fetch_place_coordinates(place):
+            try:
+                return self.fetch_coordinates(apikey, place)
+            except requests.RequestException as error:
+                return error
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(places))) as executor:
+            return dict(zip(places, executor.map(fetch_place_coordinates, places)))
+
+
+geocoder_client = None
+geocoder_client_lock = threading.Lock()
+
+
+def get_geocoder_client():
+    global geocoder_client
+    with geocoder_client_lock:
+        if geocoder_client is None:
+            geocoder_client = GeocoderClient(
+                base_url=settings.GEOCODER_URL,
+                connect_timeout=settings.GEOCODER_CONNECT_TIMEOUT,
+                read_timeout=settings.GEOCODER_READ_TIMEOUT,
+                retries=settings.GEOCODER_RETRIES,
+                failure_threshold=settings.GEOCODER_FAILURE_THRESHOLD,
+                reset_timeout=settings.GEOCODER_RESET_TIMEOUT,
+                pool_size=settings.GEOCODER_MAX_WORKERS,
+            )
+        return geocoder_client
 
 
 def fetch_coordinates(apikey, place):
-    base_url = 'https://geocode-maps.yandex.ru/1.x'
-    params = {'geocode': place, 'apikey': apikey, 'format': 'json'}
-    response = requests.get(base_url, params=params)
-    response.raise_for_status()
-    found_places = response.json()['response']['GeoObjectCollection']['featureMember']
-    if not found_places:
-        return
-    most_relevant = found_places[0]
-    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(' ')
-    return {'lon': lon, 'lat': lat}
+    return get_geocoder_client().fetch_coordinates(apikey, place)
+
+
+def fetch_coordinates_many(apikey, places):
+    return get_geocoder_client().fetch_coordinates_many(
+        apikey, places, max_workers=settings.GEOCODER_MAX_WORKERS
+    )
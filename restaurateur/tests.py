@@ -1,3 +1,180 @@
+from datetime import timedelta
+from urllib.parse import parse_qs
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from foodcartapp.models import Order
+from foodcartapp.models import OrderCandidate
+from foodcartapp.models import OrderItem
+from foodcartapp.models import Product
+from foodcartapp.models import ProductCategory
+from foodcartapp.models import Restaurant
+from foodcartapp.models import RestaurantMenuItem
+from restaurateur.views import OrdersFilter
+from restaurateur.views import decode_orders_cursor
+from restaurateur.views import encode_orders_cursor
+from restaurateur.views import filter_orders
+from restaurateur.views import get_orders_page
+
+
+class OrdersPageTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.product = Product.objects.create(name='Бургер', price=100, category=category)
+        cls.first_restaurant = Restaurant.objects.create(name='Первый', address='Москва, Арбат, 1')
+        cls.second_restaurant = Restaurant.objects.create(name='Второй', address='Москва, Арбат, 2')
+        cls.manager = User.objects.create_user('manager', password='password', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.manager)
+
+    def create_order(self, **fields):
+        order = Order.objects.create(
+            address='Москва, Тверская, 1',
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79991234567',
+            **fields,
+        )
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, total_price=100)
+        return order
+
+    def get_orders_page(self, **params):
+        return self.client.get(reverse('restaurateur:view_orders'), params)
+
+
+class OrdersPageCandidatesTest(OrdersPageTestCase):
+    def test_stored_ranking_is_shown(self):
+        order = self.create_order(candidates_outdated=False)
+        OrderCandidate.objects.create(
+            order=order, restaurant=self.second_restaurant, rank=0, distance=1.2345
+        )
+        OrderCandidate.objects.create(order=order, restaurant=self.first_restaurant, rank=1)
+
+        response = self.get_orders_page()
+
+        order_details, = response.context['order_items']
+        self.assertEqual(
+            order_details['restaurants'],
+            [(self.second_restaurant, 1.23), (self.first_restaurant, None)],
+        )
+        order.refresh_from_db()
+        self.assertIsNone(order.candidates_updated_at)
+
+    def test_outdated_ranking_is_updated(self):
+        RestaurantMenuItem.objects.create(restaurant=self.first_restaurant, product=self.product)
+        order = self.create_order()
+        OrderCandidate.objects.create(order=order, restaurant=self.second_restaurant, rank=0)
+
+        response = self.get_orders_page()
+
+        order_details, = response.context['order_items']
+        self.assertEqual(order_details['restaurants'], [(self.first_restaurant, None)])
+        order.refresh_from_db()
+        self.assertFalse(order.candidates_outdated)
+        self.assertIsNotNone(order.candidates_updated_at)
+
+    def test_page_is_for_managers_only(self):
+        self.client.logout()
+        response = self.get_orders_page()
+        self.assertRedirects(response, f"{reverse('restaurateur:login')}?next={reverse('restaurateur:view_orders')}")
+
+
+class OrdersPaginationTest(OrdersPageTestCase):
+    def test_cursor_round_trip(self):
+        order = self.create_order()
+
+        self.assertEqual(
+            decode_orders_cursor(encode_orders_cursor(order)),
+            (order.registered_at, order.id),
+        )
+
+    def test_invalid_cursor(self):
+        for cursor in ('', 'garbage', '2021-01-01T00:00:00+00:00_x', 'yesterday_1', '2021-13-45T00:00:00_1'):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_orders_cursor(cursor))
+
+    def test_pages_share_registration_time(self):
+        registered_at = timezone.now()
+        orders = [self.create_order(registered_at=registered_at) for _ in range(5)]
+
+        pages = []
+        cursor = None
+        while True:
+            orders_page, cursor = get_orders_page(Order.objects.all(), cursor, 2)
+            pages.append([order.id for order in orders_page])
+            if not cursor:
+                break
+
+        self.assertEqual(
+            pages,
+            [[orders[0].id, orders[1].id], [orders[2].id, orders[3].id], [orders[4].id]],
+        )
+
+    def test_last_full_page_has_no_next_cursor(self):
+        self.create_order()
+        self.create_order()
+
+        orders_page, cursor = get_orders_page(Order.objects.all(), None, 2)
+
+        self.assertEqual(len(orders_page), 2)
+        self.assertIsNone(cursor)
+
+    def test_invalid_cursor_returns_first_page(self):
+        order = self.create_order()
+
+        orders_page, cursor = get_orders_page(Order.objects.all(), 'garbage', 2)
+
+        self.assertEqual(orders_page, [order])
+        self.assertIsNone(cursor)
+
+    @override_settings(ORDERS_PAGE_SIZE=1)
+    def test_next_page_link_keeps_filter(self):
+        first_order = self.create_order(payment_method='Card')
+        second_order = self.create_order(payment_method='Card')
+        self.create_order(payment_method='Cash')
+
+        response = self.get_orders_page(payment_method='Card')
+        self.assertEqual([order['id'] for order in response.context['order_items']], [first_order.id])
+        next_page_query = parse_qs(response.context['next_page_query'])
+        self.assertEqual(next_page_query['payment_method'], ['Card'])
+
+        response = self.get_orders_page(payment_method='Card', after=next_page_query['after'][0])
+        self.assertEqual([order['id'] for order in response.context['order_items']], [second_order.id])
+        self.assertIsNone(response.context['next_page_query'])
+
+
+class OrdersFilterTest(OrdersPageTestCase):
+    def filter_orders(self, **params):
+        orders = filter_orders(Order.objects.order_by('id'), OrdersFilter(params))
+        return list(orders)
+
+    def test_payment_method(self):
+        card_order = self.create_order(payment_method='Card')
+        self.create_order(payment_method='Cash')
+
+        self.assertEqual(self.filter_orders(payment_method='Card'), [card_order])
+
+    def test_restaurant_assignment(self):
+        assigned_order = self.create_order(restaurant=self.first_restaurant)
+        unassigned_order = self.create_order()
+
+        self.assertEqual(self.filter_orders(restaurant='assigned'), [assigned_order])
+        self.assertEqual(self.filter_orders(restaurant='unassigned'), [unassigned_order])
+        self.assertEqual(self.filter_orders(restaurant=''), [assigned_order, unassigned_order])
+
+    def test_older_than(self):
+        old_order = self.create_order(registered_at=timezone.now() - timedelta(minutes=30))
+        self.create_order()
+
+        self.assertEqual(self.filter_orders(older_than='20'), [old_order])
+
+    def test_invalid_filter_is_ignored(self):
+        orders = [self.create_order(), self.create_order()]
 
-# Create your tests here.
+        self.assertEqual(self.filter_orders(older_than='-1', payment_method='Bitcoin'), orders)
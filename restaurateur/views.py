@@ -1,5 +1,5 @@
-import copy
-from operator import itemgetter
+from collections import defaultdict
+from datetime import timedelta
 
 from django import forms
 from django.conf import settings
@@ -7,18 +7,22 @@ from django.contrib.auth import authenticate
 from django.contrib.auth import login
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.decorators import user_passes_test
+from django.db.models import Q
 from django.shortcuts import redirect
 from django.shortcuts import render
 from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.views import View
-from geopy import distance
 
+from foodcartapp.candidates import update_order_candidates
 from foodcartapp.models import Order
+from foodcartapp.models import OrderCandidate
 from foodcartapp.models import Product
 from foodcartapp.models import Restaurant
-from location.models import DeliveryLocation
-from location.models import RestaurantLocation
-from location.yandex_geocoder import fetch_coordinates
+from location.geocoding import enqueue_addresses
+from location.geocoding import get_stored_coordinates
+from location.models import GeocoderTask
 
 
 class Login(forms.Form):
@@ -38,6 +42,29 @@ class Login(forms.Form):
     )
 
 
+class OrdersFilter(forms.Form):
+    RESTAURANT_ASSIGNMENT = [
+        ('', 'Все заказы'),
+        ('assigned', 'Ресторан назначен'),
+        ('unassigned', 'Ресторан не назначен'),
+    ]
+
+    payment_method = forms.ChoiceField(
+        label='Способ оплаты', required=False,
+        choices=[('', 'Любой'), *Order.PAYMENT_METHOD],
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    restaurant = forms.ChoiceField(
+        label='Ресторан', required=False,
+        choices=RESTAURANT_ASSIGNMENT,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    older_than = forms.IntegerField(
+        label='Старше, мин.', required=False, min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
+
 class LoginView(View):
     def get(self, request, *args, **kwargs):
         form = Login()
@@ -105,97 +132,118 @@ def view_restaurants(request):
     })
 
 
-def serialize_restaurants(restaurants):
-    restaurant_locations = {
-        location.address: {'lon': location.lon, 'lat': location.lat}
-        for location in RestaurantLocation.objects.all()
-    }
-
-    serialized_restaurants = []
-    for restaurant in restaurants:
-        restaurant_coordinates = restaurant_locations.get(restaurant.address)
-        if not restaurant_coordinates:
-            restaurant_coordinates = fetch_coordinates(settings.YANDEX_GEOCODER_API, restaurant.address)
-            if restaurant_coordinates:
-                RestaurantLocation.objects.get_or_create(
-                    address=restaurant.address,
-                    lon=restaurant_coordinates['lon'],
-                    lat=restaurant_coordinates['lat']
-                )
-
-        serialized_restaurants.append(
-            {
-                'name': restaurant.name,
-                'available_items': [menu_item.product.name for menu_item in restaurant.menu_items.all() if menu_item.availability],
-                'coordinates': restaurant_coordinates,
-            }
+def filter_orders(orders, orders_filter):
+    if not orders_filter.is_valid():
+        return orders
+    payment_method = orders_filter.cleaned_data['payment_method']
+    restaurant = orders_filter.cleaned_data['restaurant']
+    older_than = orders_filter.cleaned_data['older_than']
+
+    if payment_method:
+        orders = orders.filter(payment_method=payment_method)
+    if restaurant == 'assigned':
+        orders = orders.filter(restaurant__isnull=False)
+    elif restaurant == 'unassigned':
+        orders = orders.filter(restaurant__isnull=True)
+    if older_than is not None:
+        orders = orders.filter(
+            registered_at__lte=timezone.now() - timedelta(minutes=older_than)
         )
-    return serialized_restaurants
+    return orders
 
 
-def get_distance_to_user(end_point, user_position):
-    return round(distance.distance(
-        user_position,
-        end_point
-    ).km, 2)
+def encode_orders_cursor(order):
+    return f'{order.registered_at.isoformat()}_{order.id}'
 
 
-def get_available_restaurants(order_items_names, restaurants):
-    available_restaurants = []
-    for restaurant in restaurants:
-        if order_items_names.issubset(restaurant['available_items']):
-            available_restaurants.append(restaurant)
-    return available_restaurants
+def decode_orders_cursor(cursor):
+    registered_at, _, order_id = cursor.rpartition('_')
+    try:
+        registered_at = parse_datetime(registered_at)
+        order_id = int(order_id)
+    except ValueError:
+        return None
+    if not registered_at:
+        return None
+    return registered_at, order_id
 
 
-def add_distance_to_user(restaurants, order_coordinates):
-    for restaurant in restaurants:
-        if order_coordinates:
-            restaurant['order_distance'] = get_distance_to_user(
-                (restaurant['coordinates']['lat'],
-                 restaurant['coordinates']['lon']),
-                (order_coordinates['lat'], order_coordinates['lon'])
-            )
-        else:
-            restaurant['order_distance'] = 0
-    return restaurants
+def get_orders_page(orders, cursor, page_size):
+    orders = orders.order_by('registered_at', 'id')
+    decoded_cursor = cursor and decode_orders_cursor(cursor)
+    if decoded_cursor:
+        registered_at, order_id = decoded_cursor
+        orders = orders.filter(
+            Q(registered_at__gt=registered_at)
+            | Q(registered_at=registered_at, id__gt=order_id)
+        )
+
+    orders_page = list(orders[:page_size + 1])
+    if len(orders_page) <= page_size:
+        return orders_page, None
+    orders_page = orders_page[:page_size]
+    return orders_page, encode_orders_cursor(orders_page[-1])
+
+
+def has_actual_delivery_snapshot(order, order_coordinates):
+    order_coordinates = order_coordinates or {}
+    return (
+        order.delivery_lon == order_coordinates.get('lon')
+        and order.delivery_lat == order_coordinates.get('lat')
+    )
 
 
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_orders(request):
-    raw_orders = Order.objects.filter(status='RAW').prefetch_related('items__product').total_price()
-    restaurants = Restaurant.objects.prefetch_related('menu_items__product')
-    serialized_restaurants = serialize_restaurants(restaurants)
+    orders_filter = OrdersFilter(request.GET)
+    raw_orders = filter_orders(
+        Order.objects.filter(status='RAW'),
+        orders_filter
+    )
+    raw_orders, next_cursor = get_orders_page(
+        raw_orders, request.GET.get('after'), settings.ORDERS_PAGE_SIZE
+    )
+    next_page_query = None
+    if next_cursor:
+        next_page_query = request.GET.copy()
+        next_page_query['after'] = next_cursor
+        next_page_query = next_page_query.urlencode()
+    first_page_query = request.GET.copy()
+    first_page_query.pop('after', None)
+
     raw_orders_addresses = {order.address for order in raw_orders}
-    delivery_locations = {
-        location.address: {'lon':location.lon, 'lat':location.lat}
-        for location in DeliveryLocation.objects.filter(address__in=raw_orders_addresses)
-    }
+    delivery_locations = get_stored_coordinates(raw_orders_addresses, GeocoderTask.DELIVERY)
+    enqueue_addresses(
+        raw_orders_addresses.difference(delivery_locations),
+        GeocoderTask.DELIVERY
+    )
+
+    update_order_candidates(
+        order for order in raw_orders
+        if order.candidates_outdated or not has_actual_delivery_snapshot(
+            order, delivery_locations.get(order.address)
+        )
+    )
+    orders_candidates = defaultdict(list)
+    candidates = (
+        OrderCandidate.objects
+        .filter(order__in=raw_orders)
+        .select_related('restaurant')
+        .only('order_id', 'distance', 'restaurant__name')
+    )
+    for candidate in candidates:
+        distance = None if candidate.distance is None else round(candidate.distance, 2)
+        orders_candidates[candidate.order_id].append((candidate.restaurant, distance))
 
     orders_details = []
     for order in raw_orders:
-        order_items_names = {order_item.product.name for order_item in order.items.all()}
         order_coordinates = delivery_locations.get(order.address)
-
         if not order_coordinates:
-            order_coordinates = fetch_coordinates(settings.YANDEX_GEOCODER_API, order.address)
-            if order_coordinates:
-                DeliveryLocation.objects.get_or_create(
-                    address=order.address,
-                    lon=order_coordinates['lon'],
-                    lat=order_coordinates['lat']
-                )
-
-        available_restaurants = get_available_restaurants(
-            order_items_names, copy.deepcopy(serialized_restaurants)
-        )
-        available_restaurants_with_distance = add_distance_to_user(
-            available_restaurants, order_coordinates
-        )
-
-        sorted_available_restaurants = sorted(
-            available_restaurants_with_distance, key=itemgetter('order_distance')
-        )
+            coordinates_status = 'pending'
+        elif order_coordinates['lon'] is None:
+            coordinates_status = 'not_found'
+        else:
+            coordinates_status = 'found'
 
         order_details = {
             'id': order.id,
@@ -207,10 +255,15 @@ def view_orders(request):
             'phonenumber': order.phonenumber,
             'address': order.address,
             'comment': order.comment,
-            'restaurants': sorted_available_restaurants,
+            'coordinates_status': coordinates_status,
+            'restaurants': orders_candidates[order.id],
         }
         orders_details.append(order_details)
 
     return render(request, template_name='order_items.html', context={
-        'order_items': orders_details
+        'order_items': orders_details,
+        'orders_filter': orders_filter,
+        'is_first_page': 'after' not in request.GET,
+        'first_page_query': first_page_query.urlencode(),
+        'next_page_query': next_page_query,
     })
@@ -13,6 +13,29 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 SECRET_KEY = env('SECRET_KEY', 'v1ztep')
 DEBUG = env.bool('DEBUG', False)
 YANDEX_GEOCODER_API = env('YANDEX_GEOCODER_API_KEY')
+GEOCODER_URL = env('GEOCODER_URL', 'https://geocode-maps.yandex.ru/1.x')
+GEOCODER_CONNECT_TIMEOUT = env.float('GEOCODER_CONNECT_TIMEOUT', 3.05)
+GEOCODER_READ_TIMEOUT = env.float('GEOCODER_READ_TIMEOUT', 10)
+GEOCODER_RETRIES = env.int('GEOCODER_RETRIES', 3)
+GEOCODER_FAILURE_THRESHOLD = env.int('GEOCODER_FAILURE_THRESHOLD', 5)
+GEOCODER_RESET_TIMEOUT = env.float('GEOCODER_RESET_TIMEOUT', 30)
+GEOCODER_MAX_WORKERS = env.int('GEOCODER_MAX_WORKERS', 10)
+GEOCODER_MAX_ATTEMPTS = env.int('GEOCODER_MAX_ATTEMPTS', 5)
+GEOCODER_RETRY_DELAY = env.int('GEOCODER_RETRY_DELAY', 60)
+GEOCODER_CACHE_TTL = env.int('GEOCODER_CACHE_TTL', 30)
+GEOCODER_NOT_FOUND_TTL = env.int('GEOCODER_NOT_FOUND_TTL', 1)
+PRECISE_DISTANCES = env.bool('PRECISE_DISTANCES', False)
+ORDERS_PAGE_SIZE = env.int('ORDERS_PAGE_SIZE', 50)
+CATALOG_CACHE_CONTROL = env('CATALOG_CACHE_CONTROL', 'public, max-age=60')
+CATALOG_PAGE_SIZE = env.int('CATALOG_PAGE_SIZE', 100)
+BANNERS_CACHE_CONTROL = env('BANNERS_CACHE_CONTROL', 'public, max-age=300')
+ORDERS_IMPORT_CHUNK_SIZE = env.int('ORDERS_IMPORT_CHUNK_SIZE', 500)
+ORDER_INTAKE_MODE = env('ORDER_INTAKE_MODE', 'sync')
+PHONENUMBER_CACHE_SIZE = env.int('PHONENUMBER_CACHE_SIZE', 10000)
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', 24)
+SNAPSHOT_VERSION_CHECK_INTERVAL = env.float('SNAPSHOT_VERSION_CHECK_INTERVAL', 1)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = env.int('ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000)
+JSON_BACKEND = env('JSON_BACKEND', 'orjson')
 
 ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', ['127.0.0.1', 'localhost'])
 
@@ -81,6 +104,7 @@ WSGI_APPLICATION = 'star_burger.wsgi.application'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+PRODUCT_IMAGE_WIDTHS = env.list('PRODUCT_IMAGE_WIDTHS', [100, 300, 600], subcast=int)
 
 DATABASES = {
     'default': dj_database_url.config(
@@ -88,6 +112,13 @@ DATABASES = {
     )
 }
 
+# Snapshot versions and the availability index are shared between processes
+# through the cache. The default cache is local to a process and only fits
+# a single process setup
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://'),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -115,6 +146,13 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': env.list('API_RENDERER_CLASSES', [
+        'foodcartapp.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ]),
+}
+
 INTERNAL_IPS = [
     '127.0.0.1'
 ]